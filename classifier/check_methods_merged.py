@@ -62,7 +62,8 @@ def main():
                     merged_bool.append(False)
                     continue
                 try:
-                    merged_code = get_file_contents(project, merge_commit_id, filename)
+                    # cleaned once for all the instances of the same file
+                    merged_code = clean(get_file_contents(project, merge_commit_id, filename))
                 except Exception as e:
                     print(e, file=sys.stderr)
                     no_merging_flag = True
@@ -71,7 +72,7 @@ def main():
                     continue
             # check if merged file contains modified method
             code_after = df.iloc[i]['after']
-            if code_after in clean(merged_code):
+            if code_after in merged_code:
                 merged_bool.append(True)
             else:
                 merged_bool.append(False)
@@ -1,4 +1,3 @@
-import csv
 import os
 import shutil
 import pandas as pd
@@ -6,22 +5,24 @@ from tqdm import tqdm
 from transformers import T5Tokenizer
 from replication.Analyzer import Analyzer
 from replication.Cleaner import Cleaner
-from utils.stopwords import get_stopwords
+from replication.ParsedSource import ParsedSource
+from replication.VerdictStore import VerdictStore
+from utils.raw_data import load_raw_data
+from utils.stopwords import get_lexicon
 
 
 def get_cleaner_instance():
-    previous_predictions = pd.read_csv('../replication/english_real_predictions.tsv', sep='\t',
-                                       names=['comment', 'confidence', 'lang'],
-                                       quoting=csv.QUOTE_NONE)
+    verdicts = VerdictStore('../replication/english_real_predictions.sqlite')
+    verdicts.import_tsv('../replication/english_real_predictions.tsv')
 
     t5_tokenizer = T5Tokenizer.from_pretrained("../tokenizer/TokenizerModel.model")
-    cleaner = Cleaner(None, t5_tokenizer, get_stopwords(), previous_predictions)
+    cleaner = Cleaner(None, t5_tokenizer, get_lexicon(), verdicts)
 
     return cleaner
 
 
-def clean_comment(comment, ref, cleaner):
-    if Analyzer.check_comment_to_comment(ref[0], ref[1]):
+def clean_comment(comment, ref, cleaner, source=None):
+    if Analyzer.check_comment_to_comment(ref[0], ref[1], source):
         return None
 
     comment = Cleaner.replace_links(comment)[0]
@@ -38,12 +39,11 @@ def clean_comment(comment, ref, cleaner):
     return comment
 
 
-def add_user_tag(comment, _, is_owner, cleaner):
-    comment = cleaner.remove_stopwords(comment)
-    if is_owner:
-        return f"<AUT>{comment}"
-    else:
-        return f"<REV>{comment}"
+def add_user_tag(comments, cleaner):
+    # comments of a conversation (comment, created_at, is_owner), the stopwords of all of them removed at once
+    stripped = cleaner.remove_stopwords_column([comment for comment, _, _ in comments])
+    return [f"<AUT>{comment}" if is_owner else f"<REV>{comment}"
+            for comment, (_, _, is_owner) in zip(stripped, comments)]
 
 
 def main():
@@ -66,10 +66,12 @@ def main():
         df_processed = pd.read_csv(filepath)
         df_processed['created_at'] = pd.to_datetime(df_processed['created_at'])
 
-        df_original = pd.read_csv(os.path.join('../data', file))
-        df_original['file_content_before'] = df_original['file_content_before'].fillna('')
+        df_original = load_raw_data(os.path.join('../data', file), 'conversations')
         df_original['created_at'] = pd.to_datetime(df_original['created_at'])
 
+        # sources of the file revisions of this project, parsed once and shared by all their comments
+        sources = {}
+
         conversation_context = []
         for index, row in tqdm(df_processed.iterrows(), total=len(df_processed), leave=True, position=1):
             matches = df_original[(df_original['pull_number'] == row['pull_num']) &
@@ -80,10 +82,12 @@ def main():
             for _, match in matches.iterrows():
                 # check method signature matches
                 _, _, ref = Analyzer.get_info_github(match)
-                Analyzer.save_temp_code(match, 'GitHub')
-                method_found = Analyzer.search_before_method(ref)
+                content = match['file_content_while']
+                if content not in sources:
+                    sources[content] = ParsedSource.from_text('before.java', content)
+                method_found = Analyzer.search_before_method(ref, sources[content])
                 if (len(method_found) == 1) and (method_found[0].long_name == row['method_name']):
-                    comment = clean_comment(match['message'], ref, cleaner)
+                    comment = clean_comment(match['message'], ref, cleaner, sources[content])
                     if comment is not None:
                         valid_comments.append((comment, match['created_at'], match['user_id'] == match['owner_id']))
 
@@ -91,15 +95,11 @@ def main():
             valid_comments = [x for x in valid_comments if x[1] < row['created_at']]
             valid_comments = sorted(valid_comments, key=lambda x: x[1], reverse=True)
 
-            conversation_context.append(''.join([add_user_tag(*x, cleaner) for x in valid_comments]))
+            conversation_context.append(''.join(add_user_tag(valid_comments, cleaner)))
 
         df_processed['conversation_context'] = conversation_context
         df_processed.to_csv(os.path.join(path_context_data, file), index=False)
 
-        os.remove('start.java')
-        os.remove('before.java')
-        os.remove('after.java')
-
 
 if __name__ == '__main__':
     main()
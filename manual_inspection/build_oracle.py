@@ -4,6 +4,7 @@ import subprocess
 import numpy as np
 import pandas as pd
 from SentiCR.SentiCR.SentiCR import SentiCR
+from utils.raw_data import load_raw_data
 
 
 def clean_data(df):
@@ -139,7 +140,7 @@ def extract_polarity(df, strategy, sa_tool='sentistrength'):
 def build_oracle():
     df_all = clean_data(pd.read_csv('manual_analysis_all.csv'))
     df_filtered = merge_and_clean_data(pd.read_csv('manual_analysis_filtered.csv'),
-                                       pd.read_csv('manual_analysis_filtered_complete.csv'))
+                                       load_raw_data('manual_analysis_filtered_complete.csv', 'manual_inspection'))
 
     # add polarity to dataframe (separately because indexes overlap)
     df_all = extract_polarity(df_all, 'last_answer')
@@ -3,22 +3,31 @@ import string
 import pandas as pd
 from collections import Counter
 from itertools import chain
+from utils.stopwords import StopwordLexicon
+
+
+# stopwords of the last answers, compared with the lowercase words
+STOPWORDS = ['just', 'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and', 'any', 'are',
+             'as', 'at', 'be', 'because', 'been', 'before', 'being', 'below', 'between', 'both', 'but', 'by',
+             'could', 'did', 'do', 'does', 'doing', 'down', 'during', 'each', 'few', 'for', 'from', 'further',
+             'had', 'has', 'have', 'having', 'he', 'he', 'her', 'here', 'hers', 'herself', 'him', 'himself', 'his',
+             'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'itself', 'me', 'more', 'most', 'my', 'myself',
+             'no', 'nor', 'not', 'of', 'off', 'on', 'once', 'only', 'or', 'other', 'ought', 'our', 'ours',
+             'ourselves', 'out', 'over', 'own', 'same', 'she', 'should', 'so', 'some', 'such', 'than', 'that',
+             'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'these', 'they', 'this', 'those',
+             'through', 'to', 'too', 'under', 'until', 'up', 'very', 'was', 'we', 'were', 'what', 'when', 'where',
+             'which', 'while', 'who', 'whom', 'why', 'with', 'would', 'you', 'your', 'yours', 'yourself',
+             'yourselves']
+LEXICON = StopwordLexicon(STOPWORDS, case=str.lower)
+PUNCTUATION = str.maketrans('', '', string.punctuation)
 
 
 def clean_comment(comment):
-    stopwords = ['just', 'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and', 'any', 'are',
-                 'as', 'at', 'be', 'because', 'been', 'before', 'being', 'below', 'between', 'both', 'but', 'by',
-                 'could', 'did', 'do', 'does', 'doing', 'down', 'during', 'each', 'few', 'for', 'from', 'further',
-                 'had', 'has', 'have', 'having', 'he', 'he', 'her', 'here', 'hers', 'herself', 'him', 'himself', 'his',
-                 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'itself', 'me', 'more', 'most', 'my', 'myself',
-                 'no', 'nor', 'not', 'of', 'off', 'on', 'once', 'only', 'or', 'other', 'ought', 'our', 'ours',
-                 'ourselves', 'out', 'over', 'own', 'same', 'she', 'should', 'so', 'some', 'such', 'than', 'that',
-                 'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'these', 'they', 'this', 'those',
-                 'through', 'to', 'too', 'under', 'until', 'up', 'very', 'was', 'we', 'were', 'what', 'when', 'where',
-                 'which', 'while', 'who', 'whom', 'why', 'with', 'would', 'you', 'your', 'yours', 'yourself',
-                 'yourselves']
-    comment = comment.lower().translate(str.maketrans('', '', string.punctuation))
-    return ' '.join([word for word in comment.split() if word not in stopwords])
+    return clean_comments([comment])[0]
+
+
+def clean_comments(comments):
+    return LEXICON.strip_stopwords([comment.lower().translate(PUNCTUATION) for comment in comments])
 
 
 def get_most_common_ngrams(df, change_ok, n):
@@ -36,7 +45,7 @@ def main():
 
     # Last answer term frequency
     print('########### Last answer term frequency ###########')
-    df['last_answer'] = df['last_answer'].apply(lambda x: clean_comment(x))
+    df['last_answer'] = clean_comments(df['last_answer'])
     tf = df.assign(last_answer=df['last_answer'].str.split()).explode("last_answer") \
         .groupby("change_ok", sort=False)['last_answer'].value_counts()
     print(tf)
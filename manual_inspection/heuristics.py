@@ -3,7 +3,8 @@ import os.path
 import sys
 import pandas as pd
 from build_oracle import build_oracle, clean_data, merge_and_clean_data, extract_polarity
-from get_statistics import clean_comment
+from get_statistics import clean_comments
+from utils.raw_data import load_raw_data
 
 
 def evaluate_heuristics(df):
@@ -66,8 +67,7 @@ def last_answer_keywords_heuristics(df):
                      "thank much", "good idea", "will fix", "good catch", "will cleanup"]
     keywords_remove = ["create confusion", "cant fix"]
 
-    for index, row in df.iterrows():
-        cleaned_answer = clean_comment(row['last_answer'])
+    for index, cleaned_answer in zip(df.index, clean_comments(df['last_answer'])):
         for keyword in keywords_keep:
             if keyword in cleaned_answer:
                 df.at[index, 'filtered_out'] = False
@@ -88,7 +88,7 @@ def filter_out_negative_answers(df, sa_tool):
 def run_heuristics(sa_tool=None):  # sa_tool = 'sentistrength' or 'senticr'
     df_all = clean_data(pd.read_csv('manual_analysis_all.csv'))
     df_filtered = merge_and_clean_data(pd.read_csv('manual_analysis_filtered.csv'),
-                                       pd.read_csv('manual_analysis_filtered_complete.csv'))
+                                       load_raw_data('manual_analysis_filtered_complete.csv', 'manual_inspection'))
 
     if sa_tool is not None:
         # add polarity to dataframe (separately because indexes overlap)
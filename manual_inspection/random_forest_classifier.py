@@ -13,6 +13,7 @@ from weka.classifiers import Classifier
 from weka.classifiers import Evaluation
 from weka.core.classes import Random
 from build_oracle import clean_data, merge_and_clean_data, extract_polarity
+from utils.raw_data import load_raw_data
 
 
 def run_random_forest_classifier(df, strategy, balancing=True):  # strategy = 'answers' or 'last_answer'
@@ -106,7 +107,7 @@ def classify_instances(df, strategy):
 def main(strategy, sa_tool='sentistrength', balancing=True):  # strategy = 'answers' or 'last_answer'
     df_all = clean_data(pd.read_csv('manual_analysis_all.csv'))
     df_filtered = merge_and_clean_data(pd.read_csv('manual_analysis_filtered.csv'),
-                                       pd.read_csv('manual_analysis_filtered_complete.csv'))
+                                       load_raw_data('manual_analysis_filtered_complete.csv', 'manual_inspection'))
 
     # add polarity to dataframe (separately because indexes overlap)
     df_all = extract_polarity(df_all, strategy, sa_tool)
@@ -1,12 +1,76 @@
-import lizard
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from replication.ParseCache import ParseCache
+from replication.ParsedSource import ParsedSource
+from replication.Telemetry import Telemetry
+
+# cache of the lizard parses of each worker process of Analyzer.remove_invalid_data
+worker_parse_cache = None
+
+
+def init_worker(cache_max_size, cache_path):
+    global worker_parse_cache
+    if cache_max_size is not None:
+        worker_parse_cache = ParseCache(cache_max_size, cache_path)
+
+
+def create_executor(workers, parse_cache=None):
+    # pool of the workers of Analyzer.remove_invalid_data, to be shared by all the chunks of a file so that the
+    # processes are started once and their parse caches are kept
+    if parse_cache is None:
+        initargs = (None, None)
+    else:
+        initargs = (parse_cache.max_size // workers, parse_cache.path)
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs)
+
+
+def extract_chunk(df, hub):
+    analyzer = Analyzer(df, hub, in_memory=True, parse_cache=worker_parse_cache)
+    cache_before = {} if worker_parse_cache is None else worker_parse_cache.get_counters()
+    records = list(analyzer.extract_records())
+
+    counters = {counter: getattr(analyzer, counter) for counter in Analyzer.REJECTION_COUNTERS}
+    cache_counters = {} if worker_parse_cache is None else \
+        {counter: value - cache_before[counter] for counter, value in worker_parse_cache.get_counters().items()}
+    return records, counters, cache_counters, analyzer.telemetry.stages
+
+
+class AnalyzedRecord:
+    __slots__ = ['project', 'pull_id', 'pull_num', 'commit_before', 'commit_while', 'filename', 'method_name',
+                 'comment', 'created_at', 'start', 'before', 'before_marked', 'after']
+
+    def __init__(self, *values):
+        for column, value in zip(AnalyzedRecord.__slots__, values):
+            setattr(self, column, value)
 
 
 class Analyzer:
+    OUTPUT_COLUMNS = AnalyzedRecord.__slots__
 
-    def __init__(self, df, hub):
+    # counters of the rows discarded by remove_invalid_data
+    REJECTION_COUNTERS = ['no_valid_ref', 'no_comment', 'comm_to_comm', 'no_method_before', 'before_equal_after',
+                          'no_marked', 'no_method_start', 'no_method_after']
+
+    # stages of the Analyzer in the order they are applied, with the counters of the rows they discard
+    STAGES = [('remove_contributor_comments', ['contributor_comments']), ('remove_nan_data', ['nan_data']),
+              ('load_sources', []), ('check_ref', ['no_valid_ref', 'comm_to_comm']), ('parse', []),
+              ('search_before', ['no_method_before']), ('marking', ['no_marked']),
+              ('search_after', ['no_method_after']), ('search_start', []),
+              ('before_equal_after', ['before_equal_after'])]
+
+    def __init__(self, df, hub, in_memory=False, parse_cache=None, telemetry=None, executor=None):
         self.df = df
         self.hub = hub
+        # analyze the file contents as strings instead of going through start.java, before.java and after.java
+        self.in_memory = in_memory
+        # optional ParseCache, to parse identical file contents only once
+        self.parse_cache = parse_cache
+        # time spent and rows discarded by each stage, reported once all the records have been extracted
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        # optional pool made by create_executor, otherwise one is started for each call with workers > 1
+        self.executor = executor
+        self.rows_in = len(df)
         self.nan_data = 0
         self.contributor_comments = 0
         self.no_valid_ref = 0
@@ -19,103 +83,171 @@ class Analyzer:
         self.no_method_after = 0
 
     def remove_contributor_comments(self):
-        if self.hub == 'GitHub':
-            new_df = self.df[self.df['user_id'] != self.df['owner_id']]
-        elif self.hub == 'Gerrit':
-            new_df = self.df[self.df['change_owner'] != self.df['owner']]
-        else:
-            print('WARNING! Hub do not supported')
-            return
+        with self.telemetry.stage('remove_contributor_comments'):
+            if self.hub == 'GitHub':
+                new_df = self.df[self.df['user_id'] != self.df['owner_id']]
+            elif self.hub == 'Gerrit':
+                new_df = self.df[self.df['change_owner'] != self.df['owner']]
+            else:
+                print('WARNING! Hub do not supported')
+                return
         self.contributor_comments = len(self.df) - len(new_df)
         self.df = new_df
 
     def remove_nan_data(self):
-        if self.hub == 'GitHub':
-            new_df = self.df.dropna(subset=['message', 'file_content_while', 'file_content_after'])
-        elif self.hub == 'Gerrit':
-            new_df = self.df.dropna(subset=['message', 'file_content_before', 'file_content_after'])
-        else:
-            print('WARNING! Hub do not supported')
-            return
+        with self.telemetry.stage('remove_nan_data'):
+            if self.hub == 'GitHub':
+                new_df = self.df.dropna(subset=['message', 'file_content_while', 'file_content_after'])
+            elif self.hub == 'Gerrit':
+                new_df = self.df.dropna(subset=['message', 'file_content_before', 'file_content_after'])
+            else:
+                print('WARNING! Hub do not supported')
+                return
         self.nan_data = len(self.df) - len(new_df)
         self.df = new_df
 
-    def remove_invalid_data(self):
-        projects = []
-        pull_ids = []
-        pull_nums = []
-        commits_before = []
-        commits_while = []
-        filenames = []
-        method_names = []
-        comments = []
-        created_at = []
-        start_methods = []  # methods before pull
-        before_methods = []
-        before_marked_methods = []
-        after_methods = []
+    def remove_invalid_data(self, workers=1, chunk_size=1000):
+        return Analyzer.records_to_df(self.iter_records(workers, chunk_size))
+
+    def iter_records(self, workers=1, chunk_size=1000):
+        # the rejection counters are complete once all the records have been consumed
 
         # replace nan data in file_content_before with ''
         self.df['file_content_before'] = self.df['file_content_before'].fillna('')
 
+        if workers > 1:
+            yield from self.extract_records_parallel(workers, chunk_size)
+        else:
+            yield from self.extract_records()
+
+        self.telemetry.add_counters(Analyzer.STAGES, self, self.rows_in)
+
+    def extract_records_parallel(self, workers, chunk_size):
+        # the workers always analyze the rows in memory, as they cannot share the temp files
+        if self.executor is not None:
+            yield from self.submit_chunks(self.executor, workers, chunk_size)
+            return
+        with create_executor(workers, self.parse_cache) as executor:
+            yield from self.submit_chunks(executor, workers, chunk_size)
+
+    def submit_chunks(self, executor, workers, chunk_size):
+        # submit a bounded number of chunks at a time, so that the whole input is not copied at once,
+        # and collect them in order to keep the order of the rows
+        pending = deque()
+        for start in range(0, len(self.df), chunk_size):
+            pending.append(executor.submit(extract_chunk, Analyzer.get_chunk(self.df, start, chunk_size), self.hub))
+            if len(pending) >= 2 * workers:
+                yield from self.add_chunk_results(*pending.popleft().result())
+        while pending:
+            yield from self.add_chunk_results(*pending.popleft().result())
+
+    @staticmethod
+    def get_chunk(df, start, chunk_size):
+        chunk = df.iloc[start:start + chunk_size].copy()
+        # only send the categories used by the chunk, e.g. the file contents loaded by utils.raw_data
+        for column in chunk.columns:
+            if isinstance(chunk[column].dtype, pd.CategoricalDtype):
+                chunk[column] = chunk[column].cat.remove_unused_categories()
+        return chunk
+
+    def add_chunk_results(self, records, counters, cache_counters, stages):
+        # the time of the stages is summed over the workers
+        self.telemetry.add(stages)
+        for counter, value in counters.items():
+            setattr(self, counter, getattr(self, counter) + value)
+        # hits and misses of the worker caches are reported by the cache of the analyzer
+        for counter, value in cache_counters.items():
+            setattr(self.parse_cache, counter, getattr(self.parse_cache, counter) + value)
+        return records
+
+    @staticmethod
+    def records_to_df(records):
+        records = list(records)
+        return pd.DataFrame({column: [getattr(record, column) for record in records]
+                             for column in Analyzer.OUTPUT_COLUMNS})
+
+    def extract_records(self):
+        last_contents = None
         for idx, row in self.df.iterrows():
             # save info
             id_ref, num_ref, ref, filename = Analyzer.get_info(row, self.hub)
 
-            # save code before and code after in a temp file
-            Analyzer.save_temp_code(row, self.hub)
-
-            # check comment not to code
-            if not Analyzer.check_len_code(ref[0], ref[1]):
+            with self.telemetry.stage('load_sources'):
+                if self.in_memory:
+                    # keep code before and code after in memory, reusing the sources of the previous row when the
+                    # comments are on the same revisions, so that their methods are only sliced once
+                    contents = Analyzer.get_contents(row, self.hub)
+                    if contents != last_contents:
+                        sources = Analyzer.load_sources(row, self.hub, self.parse_cache)
+                        last_contents = contents
+                else:
+                    # save code before and code after in a temp file
+                    Analyzer.save_temp_code(row, self.hub)
+                    sources = Analyzer.read_sources(self.parse_cache)
+
+            with self.telemetry.stage('check_ref'):
+                # check comment not to code
+                valid_ref = Analyzer.check_len_code(ref[0], ref[1], sources['before.java'])
+                # check comment to comment
+                comment_to_comment = valid_ref and Analyzer.check_comment_to_comment(ref[0], ref[1],
+                                                                                     sources['before.java'])
+            if not valid_ref:
                 self.no_valid_ref += 1
                 continue
-
-            # check comment to comment
-            if Analyzer.check_comment_to_comment(ref[0], ref[1]):
+            if comment_to_comment:
                 self.comm_to_comm += 1
                 continue
 
-            # searching for before method
-            before_found = Analyzer.search_before_method(ref)
-            if len(before_found) != 1:
-                self.no_method_before += 1
-                continue
+            # the sources are parsed by lizard on first use, so the parse is timed on its own
+            with self.telemetry.stage('parse'):
+                sources['before.java'].function_list
 
-            # save before method
-            before = Analyzer.extract_method(before_found[0], f'before.java')
+            with self.telemetry.stage('search_before'):
+                # searching for before method
+                before_found = Analyzer.search_before_method(ref, sources['before.java'])
+                # save before method
+                before = Analyzer.extract_method(before_found[0], f'before.java', sources['before.java']) \
+                    if len(before_found) == 1 else []
             if len(before) == 0:
                 self.no_method_before += 1
                 continue
 
             # mark method before with <START>, <END> tokens
-            before_marked, flag_marked = Analyzer.extract_marked_method(before_found[0], ref, self.hub)
+            with self.telemetry.stage('marking'):
+                before_marked, flag_marked = Analyzer.extract_marked_method(before_found[0], ref, self.hub,
+                                                                            sources['before.java'])
             if not flag_marked:
                 self.no_marked += 1
                 continue
 
-            # searching for after method
-            signature = before_found[0].long_name
-            after_found = Analyzer.search_method(signature, f'after.java')
-            if len(after_found) == 0:
-                self.no_method_after += 1
-                continue
+            with self.telemetry.stage('parse'):
+                sources['after.java'].function_list
 
-            # save after method
-            after = Analyzer.extract_method(after_found[0], f'after.java')
+            with self.telemetry.stage('search_after'):
+                # searching for after method
+                signature = before_found[0].long_name
+                after_found = Analyzer.search_method(signature, f'after.java', sources['after.java'])
+                # save after method
+                after = Analyzer.extract_method(after_found[0], f'after.java', sources['after.java']) \
+                    if len(after_found) > 0 else []
             if len(after) == 0:
                 self.no_method_after += 1
                 continue
 
-            # searching for start method
-            start_found = Analyzer.search_method(signature, f'start.java')
-            if len(start_found) == 0:
-                self.no_method_start += 1
-                start = ''
-            else:
-                # save start method
-                start = Analyzer.extract_method(start_found[0], f'start.java')
-                if len(start) == 0:
+            with self.telemetry.stage('parse'):
+                sources['start.java'].function_list
+
+            with self.telemetry.stage('search_start'):
+                # searching for start method
+                start_found = Analyzer.search_method(signature, f'start.java', sources['start.java'])
+                if len(start_found) == 0:
                     self.no_method_start += 1
+                    start = ''
+                else:
+                    # save start method
+                    start = Analyzer.extract_method(start_found[0], f'start.java', sources['start.java'])
+                    if len(start) == 0:
+                        self.no_method_start += 1
 
             # check before method != after method
             if before == after:
@@ -123,53 +255,9 @@ class Analyzer:
                 continue
 
             # save data extracted
-            projects.append(row['project'])
-            pull_ids.append(id_ref)
-            pull_nums.append(num_ref)
-            commits_before.append(row['commit_before'])
-            commits_while.append(row['commit_while'])
-            filenames.append(filename)
-            method_names.append(signature)
-            comments.append(row['message'])
-            created_at.append(row['created_at'])
-
-            new_start = ''
-            for line in start:
-                new_start += line
-            start_methods.append(new_start)
-
-            new_before = ''
-            for line in before:
-                new_before += line
-            before_methods.append(new_before)
-
-            new_before_marked = ''
-            for line in before_marked:
-                new_before_marked += line + '\n'
-            before_marked_methods.append(new_before_marked)
-
-            new_after = ''
-            for line in after:
-                new_after += line
-            after_methods.append(new_after)
-
-        dfr = pd.DataFrame({
-            'project': projects,
-            'pull_id': pull_ids,
-            'pull_num': pull_nums,
-            'commit_before': commits_before,
-            'commit_while': commits_while,
-            'filename': filenames,
-            'method_name': method_names,
-            'comment': comments,
-            'created_at': created_at,
-            'start': start_methods,
-            'before': before_methods,
-            'before_marked': before_marked_methods,
-            'after': after_methods
-        })
-
-        return dfr
+            yield AnalyzedRecord(row['project'], id_ref, num_ref, row['commit_before'], row['commit_while'], filename,
+                                 signature, row['message'], row['created_at'], ''.join(start), ''.join(before),
+                                 ''.join([line + '\n' for line in before_marked]), ''.join(after))
 
     @staticmethod
     def get_info(row, hub):
@@ -234,18 +322,45 @@ class Analyzer:
         f.close()
 
     @staticmethod
-    def check_len_code(start_line, end_line):
-        code_lines = [line for line in open(f'before.java')]
+    def get_contents(row, hub):
+        if hub == 'GitHub':
+            return row.file_content_before, row.file_content_while, row.file_content_after
+        return row.file_content_before, row.file_content_after
+
+    @staticmethod
+    def load_sources(row, hub, cache=None):
+        # same lines that would be read back from the temp files written by save_temp_code
+        start = ParsedSource.from_text(f'start.java', row.file_content_before, cache)
+        if hub == 'GitHub':
+            before = ParsedSource.from_text(f'before.java', row.file_content_while, cache)
+        else:
+            before = ParsedSource(f'before.java', start.lines, cache)
+        after = ParsedSource.from_text(f'after.java', row.file_content_after, cache)
+        return {'start.java': start, 'before.java': before, 'after.java': after}
+
+    @staticmethod
+    def read_sources(cache=None):
+        return {file: ParsedSource.from_file(file, cache) for file in [f'start.java', f'before.java', f'after.java']}
+
+    @staticmethod
+    def get_source(file, source=None):
+        if source is None:
+            return ParsedSource.from_file(file)
+        return source
+
+    @staticmethod
+    def check_len_code(start_line, end_line, source=None):
+        code_lines = Analyzer.get_source(f'before.java', source).lines
         if start_line > len(code_lines) or end_line > len(code_lines):
             return False
         return True
 
     @staticmethod
-    def check_comment_to_comment(start_line, end_line):
-        code_lines = [line.strip() for line in open(f'before.java')]
+    def check_comment_to_comment(start_line, end_line, source=None):
+        code_lines = Analyzer.get_source(f'before.java', source).lines
         k = start_line
         while k <= end_line:
-            current_line = code_lines[k - 1]
+            current_line = code_lines[k - 1].strip()
             if len(current_line) == 0:
                 k += 1
                 continue
@@ -256,32 +371,17 @@ class Analyzer:
         return False
 
     @staticmethod
-    def search_before_method(ref):
-        method_found = []
-        liz = lizard.analyze_file(f'before.java')
-        for liz_elem in liz.function_list:
-            if (liz_elem.start_line <= ref[0]) and (liz_elem.end_line >= ref[1]):
-                method_found.append(liz_elem)
-        return method_found
+    def search_before_method(ref, source=None):
+        return Analyzer.get_source(f'before.java', source).method_index.find_enclosing(ref[0], ref[1])
 
     @staticmethod
-    def search_method(elem_name, file):
-        method_found = []
-        liz = lizard.analyze_file(file)
-        for liz_elem in liz.function_list:
-            if liz_elem.long_name == elem_name:
-                method_found.append(liz_elem)
-                break
-        return method_found
+    def search_method(elem_name, file, source=None):
+        liz_elem = Analyzer.get_source(file, source).method_index.find_by_long_name(elem_name)
+        return [] if liz_elem is None else [liz_elem]
 
     @staticmethod
-    def extract_method(liz_elem, file):
-        method_extracted = []
-
-        code = [line for line in open(file)]
-
-        for k in range(len(code)):
-            method_extracted = code[liz_elem.start_line - 1: liz_elem.end_line]
+    def extract_method(liz_elem, file, source=None):
+        method_extracted = Analyzer.get_source(file, source).get_lines(liz_elem.start_line, liz_elem.end_line)
         if len(method_extracted) != 0:
             if len(method_extracted[-1].strip()) != 0:
                 if not method_extracted[-1].strip().endswith('}'):
@@ -289,86 +389,74 @@ class Analyzer:
         return method_extracted
 
     @staticmethod
-    def extract_marked_method(liz_elem, ref, hub):
+    def extract_marked_method(liz_elem, ref, hub, source=None):
         if hub == 'Gerrit' and len(ref) == 4:
-            m, f = Analyzer.extract_marked_method_gerrit(liz_elem, ref)
+            m, f = Analyzer.extract_marked_method_gerrit(liz_elem, ref, source)
         else:
-            m, f = Analyzer.extract_marked_method_github(liz_elem, ref)
+            m, f = Analyzer.extract_marked_method_github(liz_elem, ref, source)
         return m, f
 
     @staticmethod
-    def extract_marked_method_github(liz_elem, ref):
-        flag_marked = False
-        code = [line for line in open(f'before.java')]
-        method_extracted_marked = []
-        for k in range(len(code)):
-            if liz_elem.start_line - 1 <= k <= liz_elem.end_line - 1:
-                if code[k].endswith('\n'):
-                    current_line = code[k][:-1]
-                else:
-                    current_line = code[k]
-                if k + 1 == ref[0]:
-                    if ref[0] == ref[1]:
-                        current_line = '<START> ' + current_line + ' <END> '
-                        flag_marked = True
-                    else:
-                        current_line = '<START> ' + current_line
-                if k + 1 == ref[1] and not flag_marked:
-                    current_line += ' <END> '
-                    flag_marked = True
-                method_extracted_marked.append(current_line)
-        return method_extracted_marked, flag_marked
+    def extract_marked_method_github(liz_elem, ref, source=None):
+        source = Analyzer.get_source(f'before.java', source)
+        return Analyzer.mark_methods(source, [(liz_elem, ref, False)])[0]
 
     @staticmethod
-    def extract_marked_method_gerrit(liz_elem, ref):
-        flag_marked = False
+    def extract_marked_method_gerrit(liz_elem, ref, source=None):
         flag_char = False
         if ref[2] != 0 or ref[3] != 0:
             flag_char = True
-        file = open(f'before.java', 'r')
-        code = [line for line in file]
-        file.close()
+        source = Analyzer.get_source(f'before.java', source)
+        return Analyzer.mark_methods(source, [(liz_elem, ref, flag_char)])[0]
+
+    @staticmethod
+    def mark_methods(source, marks):
+        # marks is a list of (liz_elem, ref, flag_char) for the same file, flag_char to mark characters (Gerrit)
+        # each method is sliced once by the source, and only its lines are visited for each ref
+        return [Analyzer.mark_method_lines(source.get_method_lines(liz_elem.start_line, liz_elem.end_line),
+                                           max(liz_elem.start_line, 1), ref, flag_char)
+                for liz_elem, ref, flag_char in marks]
+
+    @staticmethod
+    def mark_method_lines(lines, first_line, ref, flag_char):
+        # lines of the method without new lines, first_line is the number of the first one in the file
+        flag_marked = False
         method_extracted_marked = []
-        for k in range(len(code)):
-            if liz_elem.start_line - 1 <= k <= liz_elem.end_line - 1:
-                if code[k].endswith('\n'):
-                    current_line = code[k][:-1]
+        for k, current_line in enumerate(lines, first_line):
+            if k == ref[0]:  # comment_start_line
+                if not flag_char:
+                    current_line = '<START> ' + current_line
                 else:
-                    current_line = code[k]
-                if k + 1 == ref[0]:  # comment_start_line
-                    if not flag_char:
-                        current_line = '<START> ' + current_line
-                    else:
-                        if ref[0] == ref[1]:
-                            new_current_line = Analyzer.add_end(current_line, ref[3])
-                            if new_current_line == current_line:
-                                break
-                            else:
-                                current_line = new_current_line
-                            new_current_line = Analyzer.add_start(current_line, ref[2])
-                            if new_current_line == current_line:
-                                break
-                            else:
-                                current_line = new_current_line
-                                flag_marked = True
-                        else:
-                            new_current_line = Analyzer.add_start(current_line, ref[2])
-                            if new_current_line == current_line:
-                                break
-                            else:
-                                current_line = new_current_line
-                if k + 1 == ref[1] and not flag_marked:
-                    if not flag_char:
-                        current_line = current_line + ' <END> '
-                        flag_marked = True
-                    else:
+                    if ref[0] == ref[1]:
                         new_current_line = Analyzer.add_end(current_line, ref[3])
+                        if new_current_line == current_line:
+                            break
+                        else:
+                            current_line = new_current_line
+                        new_current_line = Analyzer.add_start(current_line, ref[2])
                         if new_current_line == current_line:
                             break
                         else:
                             current_line = new_current_line
                             flag_marked = True
-                method_extracted_marked.append(current_line)
+                    else:
+                        new_current_line = Analyzer.add_start(current_line, ref[2])
+                        if new_current_line == current_line:
+                            break
+                        else:
+                            current_line = new_current_line
+            if k == ref[1] and not flag_marked:
+                if not flag_char:
+                    current_line = current_line + ' <END> '
+                    flag_marked = True
+                else:
+                    new_current_line = Analyzer.add_end(current_line, ref[3])
+                    if new_current_line == current_line:
+                        break
+                    else:
+                        current_line = new_current_line
+                        flag_marked = True
+            method_extracted_marked.append(current_line)
         return method_extracted_marked, flag_marked
 
     @staticmethod
@@ -377,15 +465,10 @@ class Analyzer:
             if text[start_char - 1] == ' ':
                 new_text = text[:start_char - 1] + ' <START> ' + text[start_char - 1:]
             else:
-                flag = False
-                k = 2
-                while not flag and start_char - k > 0:
-                    if text[start_char - k] == ' ':
-                        flag = True
-                    else:
-                        k += 1
-                if flag:
-                    new_text = text[:start_char - k] + ' <START>' + text[start_char - k:]
+                # last space before the character, excluding the first one
+                k = text.rfind(' ', 1, start_char - 1) if start_char - 2 > 0 else -1
+                if k != -1:
+                    new_text = text[:k] + ' <START>' + text[k:]
                 else:
                     new_text = '<START> ' + text
         except:
@@ -398,15 +481,12 @@ class Analyzer:
             if text[end_char - 1] == ' ':
                 new_text = text[:end_char - 1] + ' <END> ' + text[end_char - 1:]
             else:
-                flag = False
-                k = 2
-                while not flag and end_char + k < len(text):
-                    if text[end_char + k] == ' ':
-                        flag = True
-                    else:
-                        k += 1
-                if flag:
-                    new_text = text[:end_char + k] + ' <END> ' + text[end_char + k:]
+                # first space from two characters after the end one (negative positions count from the end first)
+                k = text.find(' ', end_char + 2)
+                if k == -1 and end_char + 2 < 0:
+                    k = text.find(' ')
+                if k != -1:
+                    new_text = text[:k] + ' <END> ' + text[k:]
                 else:
                     new_text = text + ' <END> '
         except:
@@ -0,0 +1,53 @@
+import fcntl
+import os
+from contextlib import contextmanager
+
+
+class BudgetLedger:
+
+    def __init__(self, path, limit=2000000):
+        # characters sent to Google, kept in path and shared by all the processes using the same path
+        self.path = path
+        self.limit = limit
+        # total of the last read or update of path, for reporting
+        self.used = self.read()
+
+    @contextmanager
+    def lock(self):
+        # the total is read and written under an exclusive lock, so that concurrent processes never lose an update
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r') as f:
+            return int(f.read())
+
+    def write(self, used):
+        # write to a temp file first, so that a crash while writing keeps the previous total
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(str(used))
+        os.replace(temp_path, self.path)
+        self.used = used
+
+    def reserve(self, characters):
+        # same check as before each request to Google: the total with the new characters must stay below the limit,
+        # checked against the characters reserved by all the processes so far
+        with self.lock():
+            used = self.read()
+            if used + characters >= self.limit:
+                self.used = used
+                return False
+            self.write(used + characters)
+        return True
+
+    def release(self, characters):
+        # give back the characters of requests that were reserved but failed
+        with self.lock():
+            self.write(max(0, self.read() - characters))
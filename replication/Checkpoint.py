@@ -0,0 +1,37 @@
+import os
+import pickle
+import time
+
+
+class Checkpoint:
+
+    def __init__(self, path, interval=60.0):
+        # progress of a run, written to path at most every interval seconds
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def load(self):
+        # state of the last save, None if there is none or it cannot be read
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def is_due(self):
+        return time.monotonic() - self.last_save > self.interval
+
+    def save(self, state):
+        # write to a temp file first, so that a crash while saving keeps the previous checkpoint
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.last_save = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+from google.cloud import translate_v2 as translate
+from langid.langid import LanguageIdentifier, model
+
+
+class LanguageBackend:
+
+    def __init__(self, batch_size=100, concurrency=8):
+        # texts sent in each request, and requests waiting for an answer at the same time
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def detect(self, texts):
+        # list of (language, confidence) of each text
+        if len(texts) == 0:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return [result for batch in asyncio.run(self.detect_batches(batches)) for result in batch]
+
+    async def detect_batches(self, batches):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def detect_batch(batch):
+            async with semaphore:
+                # the clients are blocking, each request waits in its own thread
+                return await asyncio.to_thread(self.detect_batch, batch)
+
+        return await asyncio.gather(*[detect_batch(batch) for batch in batches])
+
+    def detect_batch(self, texts):
+        raise NotImplementedError
+
+
+class GoogleBackend(LanguageBackend):
+
+    def __init__(self, token_path=None, batch_size=100, concurrency=8):
+        super().__init__(batch_size, concurrency)
+        working_dir = os.path.dirname(os.path.abspath(__file__))
+        # TODO: insert your json token
+        self.token_path = token_path if token_path is not None else os.path.join(working_dir, 'token.json')
+        self.client = None
+
+    def detect(self, texts):
+        if len(texts) > 0 and self.client is None:
+            # only created once, when Google is first needed
+            self.client = translate.Client.from_service_account_json(self.token_path)
+        return super().detect(texts)
+
+    def detect_batch(self, texts):
+        return [(result["language"], result["confidence"]) for result in self.client.detect_language(texts)]
+
+
+class StandInBackend(LanguageBackend):
+
+    def __init__(self, detector=None, latency=0.0, batch_size=100, concurrency=8):
+        # local detector standing in for Google, to run the pipeline offline, with latency seconds for each request
+        super().__init__(batch_size, concurrency)
+        self.detector = detector
+        self.latency = latency
+
+    def detect(self, texts):
+        if len(texts) > 0 and self.detector is None:
+            # only created once it is needed, so that the backend can be sent to other processes before
+            identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
+            self.detector = identifier.classify
+        return super().detect(texts)
+
+    def detect_batch(self, texts):
+        time.sleep(self.latency)
+        return [tuple(self.detector(text)) for text in texts]
@@ -0,0 +1,34 @@
+from bisect import bisect_right
+
+
+class MethodIndex:
+
+    def __init__(self, function_list):
+        self.function_list = function_list
+
+        # functions sorted by start line, with the furthest end line seen so far,
+        # to stop looking back as soon as no earlier function can reach the end of the query
+        self.order = sorted(range(len(function_list)), key=lambda i: function_list[i].start_line)
+        self.starts = [function_list[i].start_line for i in self.order]
+        self.max_ends = []
+        for i in self.order:
+            end_line = function_list[i].end_line
+            self.max_ends.append(end_line if not self.max_ends else max(self.max_ends[-1], end_line))
+
+        # first function for each signature, as in a linear scan of function_list
+        self.by_long_name = {}
+        for liz_elem in function_list:
+            self.by_long_name.setdefault(liz_elem.long_name, liz_elem)
+
+    def find_enclosing(self, start_line, end_line):
+        # functions that contain lines start_line..end_line, in function_list order
+        found = []
+        k = bisect_right(self.starts, start_line) - 1
+        while k >= 0 and self.max_ends[k] >= end_line:
+            if self.function_list[self.order[k]].end_line >= end_line:
+                found.append(self.order[k])
+            k -= 1
+        return [self.function_list[i] for i in sorted(found)]
+
+    def find_by_long_name(self, long_name):
+        return self.by_long_name.get(long_name)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+
+class ParseCache:
+
+    def __init__(self, max_size=512 * 1024 * 1024, path=None):
+        # approximate memory budget of the cached function lists, in bytes of their pickled form
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+        # optional folder keeping the parses across runs
+        self.path = path
+        if self.path is not None and not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(filename, source):
+        # lizard only looks at the extension of the filename to pick the language reader
+        extension = os.path.splitext(filename)[1]
+        return hashlib.sha1((extension + '\0' + source).encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def get_function_list(self, filename, source, parse):
+        key = ParseCache.get_key(filename, source)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        loaded = self.load(key)
+        if loaded is not None:
+            self.disk_hits += 1
+            self.add(key, *loaded)
+            return loaded[0]
+
+        self.misses += 1
+        function_list = parse(filename, source)
+        data = pickle.dumps(function_list, protocol=pickle.HIGHEST_PROTOCOL)
+        self.add(key, function_list, len(data))
+        self.save(key, data)
+        return function_list
+
+    def add(self, key, function_list, size):
+        self.entries[key] = (function_list, size)
+        self.size += size
+        # evict the least recently used parses, always keeping the last one
+        while self.size > self.max_size and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def get_file_path(self, key):
+        return os.path.join(self.path, key[:2], key + '.pkl')
+
+    def load(self, key):
+        if self.path is None:
+            return None
+        file_path = self.get_file_path(key)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            return pickle.loads(data), len(data)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # corrupted entry, parse again
+            return None
+
+    def save(self, key, data):
+        if self.path is None:
+            return
+        file_path = self.get_file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # write to a temp file first, so that concurrent runs never read a partial entry
+        temp_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+
+    def get_counters(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    def get_stats(self):
+        return {**self.get_counters(), 'entries': len(self.entries), 'size': self.size}
@@ -0,0 +1,64 @@
+import io
+import lizard
+from replication.MethodIndex import MethodIndex
+
+
+class ParsedSource:
+
+    def __init__(self, filename, lines, cache=None):
+        # filename is only used by lizard to pick the language reader
+        self.filename = filename
+        self.lines = lines
+        # optional ParseCache shared by the sources with the same content
+        self.cache = cache
+        self._function_list = None
+        self._method_index = None
+        self._method_lines = {}
+
+    @staticmethod
+    def from_text(filename, text, cache=None):
+        # universal newlines, as when iterating over a file opened in text mode
+        return ParsedSource(filename, [line for line in io.StringIO(text, newline=None)], cache)
+
+    @staticmethod
+    def from_file(filename, cache=None):
+        return ParsedSource(filename, [line for line in open(filename)], cache)
+
+    @property
+    def function_list(self):
+        # parsed on first use, so rows rejected before the lizard checks never pay for it
+        if self._function_list is None:
+            source = ''.join(self.lines)
+            # lizard opens files with a UTF-8 BOM as utf-8-sig
+            if source.startswith('\ufeff'):
+                source = source[1:]
+            if self.cache is None:
+                self._function_list = ParsedSource.parse(self.filename, source)
+            else:
+                self._function_list = self.cache.get_function_list(self.filename, source, ParsedSource.parse)
+        return self._function_list
+
+    @staticmethod
+    def parse(filename, source):
+        return lizard.analyze_file.analyze_source_code(filename, source).function_list
+
+    @property
+    def method_index(self):
+        if self._method_index is None:
+            self._method_index = MethodIndex(self.function_list)
+        return self._method_index
+
+    def __len__(self):
+        return len(self.lines)
+
+    def get_lines(self, start_line, end_line):
+        # 1-based and inclusive, like lizard start_line and end_line
+        return self.lines[start_line - 1:end_line]
+
+    def get_method_lines(self, start_line, end_line):
+        # lines of a method without the new lines, kept for the other comments on the same method
+        key = (start_line, end_line)
+        if key not in self._method_lines:
+            self._method_lines[key] = [line[:-1] if line.endswith('\n') else line
+                                       for line in self.get_lines(max(start_line, 1), max(end_line, 0))]
+        return self._method_lines[key]
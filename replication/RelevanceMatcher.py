@@ -0,0 +1,95 @@
+import itertools
+import numpy as np
+
+# lowercase comments discarded as they are, e.g. emoticons
+IRRELEVANT_COMMENTS = [":+1:", "+1", "\\+", ":100:", "...", "!!!", "==>", "++", "??", "-;", "... :)", "+", ";)", ":0",
+                       ":-)", ";-)", ":(", ":-(", "?!", "^^", "^^^", "???", ":/", "+:100:", "????", "..?", ":-|",
+                       "...?", "??????", ":)", "^"]
+
+# lowercase comments discarded by their number of words and the text they contain: (min words, max words or None,
+# groups of texts), a comment is discarded if it contains one of the texts of each group
+IRRELEVANCE_RULES = [
+    # Useless comments, one word, no action required or unclear action
+    (1, 1, [["done", "idem", "lgtm", "docs", "ok", "nice", "pleas", "ditto", "thank", "lol", "fine", "agre", "dito",
+             "yeh", "cool", "same", "ack", "hahaha"]]),
+    (2, 2, [["ack", "same change", "this too", "java doc", "good catch", "and this"]]),
+    # as above, see above, ditto above, same above,
+    # same here, and here, also here, here too, ditto here, here..., likewise here.
+    (1, 3, [["here", "above"]]),
+    # Request to change formatting, no impact on code
+    (1, 4, [["indent"]]),
+    # Likely a thank you message
+    (1, 4, [["works for me", "sounds good", "makes sense", "smile", "approv"]]),
+    # Request to add test code, no impact on the reviewed code
+    (1, 4, [["test"]]),
+    (1, None, [["add"], ["test"]]),
+    # Request for clarification
+    (1, 4, [["please explain", "what", "wat", "explan"]]),
+    (1, None, [["not sure"], ["understand", "meant"]]),
+    # Refers to previous comment or external resource with unclear action point
+    (1, 4, [["same as", "same remark", "said above", "do the same"]]),
+    (1, None, [["like", "see"], ["http", "https", "<link_"]]),
+    # Request to add comment
+    (1, None, [["document", "javadoc", "comment"]]),
+    # Feedback about reorganizing the PR
+    (1, 4, [["pr"]]),
+    # Comment contains a +1 to support previous comment.
+    # It may be accompanied by another word, like agree or a smile.
+    # This is the reason for < 3
+    (1, 2, [["+1"]]),
+    # The code is ok for now
+    (1, 4, [["for now"]]),
+    # Answers
+    (1, 2, [["fixed", "thank", "youre right"]]),
+]
+
+
+class RelevanceMatcher:
+
+    def __init__(self, rules=IRRELEVANCE_RULES, irrelevant_comments=IRRELEVANT_COMMENTS):
+        self.rules = rules
+        self.irrelevant_comments = frozenset(irrelevant_comments)
+
+        # all the texts of the rules, each one searched in a whole column at once
+        self.texts = sorted({text for _, _, groups in rules for group in groups for text in group})
+        self.indices = {text: i for i, text in enumerate(self.texts)}
+
+    def get_relevant(self, comments, remove_stopwords):
+        # NumPy array telling if each comment is relevant, remove_stopwords removes the stopwords of a list of comments
+        comments = [comment.lower() for comment in comments]
+        words = np.array([len(comment.split()) for comment in comments], dtype=np.int64)
+        found = self.find_texts(comments)
+
+        irrelevant = words == 0
+        irrelevant |= np.array([comment in self.irrelevant_comments for comment in comments], dtype=bool)
+        for min_words, max_words, groups in self.rules:
+            matches = words >= min_words
+            if max_words is not None:
+                matches &= words <= max_words
+            for group in groups:
+                matches &= found[:, [self.indices[text] for text in group]].any(axis=1)
+            irrelevant |= matches
+
+        # the stopwords are only removed from the comments not discarded by the rules
+        rest = np.flatnonzero(~irrelevant)
+        stripped = remove_stopwords([comments[i] for i in rest])
+        irrelevant[rest] = np.array([len(comment) == 0 for comment in stripped], dtype=bool)
+
+        return ~irrelevant
+
+    def find_texts(self, comments):
+        # boolean matrix telling if each comment contains each text, searched in all the comments joined
+        found = np.zeros((len(comments), len(self.texts)), dtype=bool)
+        # none of the texts contains the separator
+        joined = '\0'.join(comments)
+        ends = np.fromiter(itertools.accumulate(len(comment) + 1 for comment in comments), dtype=np.int64,
+                           count=len(comments))
+        for i, text in enumerate(self.texts):
+            starts = []
+            start = joined.find(text)
+            while start != -1:
+                starts.append(start)
+                start = joined.find(text, start + 1)
+            # comment of each occurrence
+            found[np.searchsorted(ends, starts, side='right'), i] = True
+        return found
@@ -0,0 +1,48 @@
+class Substitutions:
+
+    def __init__(self, pairs):
+        # pairs of (text, replacement), with the same result as calling str.replace with each of them in order
+        self.pairs = pairs
+
+        # pairs with each character in their text, only the pairs with a character found need to be applied
+        self.pairs_by_char = {}
+        for i, (text, _) in enumerate(pairs):
+            for char in text:
+                self.pairs_by_char.setdefault(char, set()).add(i)
+        self.chars = frozenset(self.pairs_by_char)
+        # most strings are ASCII, and only need to be searched for these
+        self.ascii_chars = [char for char in self.chars if char.isascii()]
+
+        # unless a replacement adds one of the characters, which may then be found by the next pairs
+        self.closed = not any(self.chars.intersection(replacement) for _, replacement in pairs)
+
+        # separator of the strings of a column, so that no text is found across two of them
+        assert '\0' not in self.chars and not any('\0' in replacement for _, replacement in pairs)
+
+    def replace(self, text):
+        for old, new in self.get_pairs(text):
+            text = text.replace(old, new)
+        return text
+
+    def replace_column(self, column):
+        # same as replace on each string of a pandas Series, missing values are kept,
+        # with one pass over the column for each pair found in it
+        for old, new in self.get_pairs('\0'.join(value for value in column if isinstance(value, str))):
+            column = column.str.replace(old, new, regex=False)
+        return column
+
+    def get_pairs(self, found):
+        # the pairs to apply, in their order, to the strings in found
+        if found.isascii():
+            chars = [char for char in self.ascii_chars if char in found]
+        else:
+            chars = self.chars.intersection(found)
+        if len(chars) == 0:
+            return []
+        if not self.closed:
+            return self.pairs
+        if len(chars) == 1:
+            indices = self.pairs_by_char[next(iter(chars))]
+        else:
+            indices = set().union(*[self.pairs_by_char[char] for char in chars])
+        return [self.pairs[i] for i in sorted(indices)]
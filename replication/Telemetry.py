@@ -0,0 +1,72 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+
+class Telemetry:
+
+    def __init__(self):
+        # wall time, calls, rows in and out and rejections of each stage, in the order they are first seen
+        self.stages = {}
+        self.start_time = time.perf_counter()
+        # other values to report, e.g. the order of the filters of the Cleaner
+        self.values = {}
+
+    def get_stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'seconds': 0.0, 'calls': 0, 'rows_in': 0, 'rows_out': 0, 'rejections': {}}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        stats = self.get_stage(name)
+        stats['calls'] += 1
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] += time.perf_counter() - start
+
+    def add_counters(self, stages, counters, rows_in):
+        # stages is a list of (stage, rejection counters) applied one after the other to rows_in rows,
+        # counters the object (e.g. Analyzer or Cleaner) holding the counters
+        for name, rejection_counters in stages:
+            stats = self.get_stage(name)
+            stats['rows_in'] += rows_in
+            for counter in rejection_counters:
+                value = getattr(counters, counter)
+                stats['rejections'][counter] = stats['rejections'].get(counter, 0) + value
+                rows_in -= value
+            stats['rows_out'] += rows_in
+
+    def set_value(self, name, value):
+        self.values[name] = value
+
+    def add(self, stages):
+        # add the stages recorded by another Telemetry, e.g. by a worker process
+        for name, other in stages.items():
+            stats = self.get_stage(name)
+            for key in ['seconds', 'calls', 'rows_in', 'rows_out']:
+                stats[key] += other[key]
+            for counter, value in other['rejections'].items():
+                stats['rejections'][counter] = stats['rejections'].get(counter, 0) + value
+
+    def get_report(self):
+        return {'seconds': time.perf_counter() - self.start_time,
+                'stages': [{'stage': name, **stats} for name, stats in self.stages.items()], **self.values}
+
+    def save(self, path):
+        # path without extension, the report is written both to path.json and path.csv (one row per stage)
+        report = self.get_report()
+        with open(path + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+
+        counters = sorted({counter for stats in self.stages.values() for counter in stats['rejections']})
+        with open(path + '.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stage', 'seconds', 'calls', 'rows_in', 'rows_out'] + counters)
+            for stats in report['stages']:
+                writer.writerow([stats['stage'], stats['seconds'], stats['calls'], stats['rows_in'], stats['rows_out']]
+                                + [stats['rejections'].get(counter, '') for counter in counters])
+        return report
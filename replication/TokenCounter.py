@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import regex
+
+
+class TokenCounter:
+
+    def __init__(self, tokenizer, num_threads=None):
+        # counts the same tokens as len(tokenizer.encode(text)), for whole lists of texts at once
+        self.tokenizer = tokenizer
+        self.num_threads = num_threads if num_threads is not None else os.cpu_count()
+
+        # SentencePiece model of the tokenizer (tokenizer/TokenizerModel.model), encoding the texts in parallel.
+        # Only the SentencePiece tokenizers (e.g. T5Tokenizer of transformers 4) call it directly, the texts are
+        # otherwise counted by the tokenizer, whose batch encoding is also native for the fast tokenizers
+        self.sp_model = getattr(tokenizer, 'sp_model', None)
+
+        # the tokenizer splits the texts on its added tokens (e.g. </s>) before calling SentencePiece,
+        # so the texts containing one of them are still counted by the tokenizer
+        added_tokens = set(tokenizer.all_special_tokens).union(tokenizer.get_added_vocab())
+        self.added_tokens = regex.compile('|'.join(regex.escape(token) for token in
+                                                   sorted(added_tokens, key=len, reverse=True)))
+
+        # tokens added to each text by encode, i.e. </s>
+        self.special_tokens = tokenizer.num_special_tokens_to_add()
+
+    def count(self, texts):
+        # NumPy array with the number of tokens of each text
+        counts = np.zeros(len(texts), dtype=np.int64)
+        if self.sp_model is not None:
+            by_tokenizer = np.array([self.added_tokens.search(text) is not None for text in texts], dtype=bool)
+        else:
+            by_tokenizer = np.ones(len(texts), dtype=bool)
+
+        positions = np.flatnonzero(~by_tokenizer)
+        if len(positions) > 0:
+            encoded = self.sp_model.encode([texts[p] for p in positions], num_threads=self.num_threads)
+            counts[positions] = [len(ids) + self.special_tokens for ids in encoded]
+
+        positions = np.flatnonzero(by_tokenizer)
+        if len(positions) > 0:
+            encoded = self.tokenizer([texts[p] for p in positions])['input_ids']
+            counts[positions] = [len(ids) for ids in encoded]
+
+        return counts
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+
+
+class VerdictStore:
+
+    def __init__(self, path=':memory:'):
+        # SQLite database keeping the language verdicts across runs, shared by all the processes using the same path
+        self.path = path
+        self.connection = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # each process opens its own connection
+        state = self.__dict__.copy()
+        state['connection'] = None
+        return state
+
+    def connect(self):
+        if self.connection is None:
+            # each verdict is written as soon as it is known, waiting for the other processes writing at the same time
+            self.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            # Google verdicts, keyed by the lowercase comment
+            self.connection.execute('CREATE TABLE IF NOT EXISTS google '
+                                    '(comment TEXT PRIMARY KEY, confidence REAL, lang TEXT)')
+            # verdicts of the local classifiers, keyed by the text they were given
+            self.connection.execute('CREATE TABLE IF NOT EXISTS local (text TEXT PRIMARY KEY, english INTEGER)')
+        return self.connection
+
+    def import_tsv(self, path):
+        # verdicts of english_real_predictions.tsv (comment, confidence and language), keeping the first of each comment
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as f:
+            rows = [line.rstrip('\n').rsplit('\t', 2) for line in f]
+        rows = [(comment, float(confidence), lang) for comment, confidence, lang in
+                [row for row in rows if len(row) == 3]]
+        connection = self.connect()
+        with connection:
+            connection.execute('BEGIN')
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO google VALUES (?, ?, ?)', rows)
+            return connection.total_changes - before
+
+    def get_google(self, text):
+        # language given by Google to the comment, None if it was never asked
+        row = self.connect().execute('SELECT lang FROM google WHERE comment = ?', (text.lower(),)).fetchone()
+        self.count(row)
+        return None if row is None else row[0]
+
+    def add_google(self, text, confidence, lang):
+        self.connect().execute('INSERT OR IGNORE INTO google VALUES (?, ?, ?)', (text.lower(), confidence, lang))
+
+    def get_local(self, text):
+        # whether the local classifiers found the text english, None if they were never asked
+        row = self.connect().execute('SELECT english FROM local WHERE text = ?', (text,)).fetchone()
+        self.count(row)
+        return None if row is None else bool(row[0])
+
+    def add_local(self, text, english):
+        self.connect().execute('INSERT OR IGNORE INTO local VALUES (?, ?)', (text, int(english)))
+
+    def count(self, row):
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -1,78 +1,299 @@
 import os
-import csv
+import cProfile
+import hashlib
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from tqdm import tqdm
-from Analyzer import Analyzer
+from Analyzer import Analyzer, create_executor
+from Checkpoint import Checkpoint
 from Cleaner import Cleaner
+from LanguageBackend import GoogleBackend
+from ParseCache import ParseCache
+from Telemetry import Telemetry
+from VerdictStore import VerdictStore
 from transformers import T5Tokenizer
-from utils.stopwords import get_stopwords
+from utils.raw_data import load_raw_data
+from utils.stopwords import get_lexicon
 
+# columns of the processed files, with the ones added by the Cleaner to the ones extracted by the Analyzer
+PROCESSED_COLUMNS = Analyzer.OUTPUT_COLUMNS + ['comment_no_stopwords', 'start_lines', 'before_lines',
+                                               'before_marked_lines']
 
-def analyze_data(df):
+# same subset used by Cleaner.remove_multiple_method_comments
+METHOD_COLUMNS = ["pull_num", "pull_id", "filename", "method_name", "commit_while"]
+
+# tokenizer and stopwords of each process of the file driver, loaded once by init_file_worker
+worker_tokenizer = None
+worker_stopwords = None
+
+
+def analyze_data(df, parse_cache=None, workers=1, chunk_size=1000, telemetry=None, executor=None):
     df.reset_index(inplace=True)
 
-    analyzer = Analyzer(df, 'GitHub')  # GitHub or Gerrit
+    analyzer = Analyzer(df, 'GitHub', in_memory=True, parse_cache=parse_cache, telemetry=telemetry,
+                        executor=executor)  # GitHub or Gerrit
     analyzer.remove_contributor_comments()
     analyzer.remove_nan_data()
 
-    return analyzer.remove_invalid_data()
+    return analyzer.remove_invalid_data(workers, chunk_size)
 
 
-def clean_data(df_to_analyze, previous_predictions, t5_tokenizer, stopwords):
-    cleaner = Cleaner(df_to_analyze, t5_tokenizer, stopwords, previous_predictions)
+def clean_data(df_to_analyze, verdicts, t5_tokenizer, stopwords, telemetry=None, language_backend=None,
+               filter_order=None):
+    cleaner = Cleaner(df_to_analyze, t5_tokenizer, stopwords, verdicts, telemetry, language_backend, filter_order)
     cleaner.clean_df()
     cleaner.remove_multiple_method_comments()
 
     return cleaner.get_df()
 
 
+def drop_duplicates_across_chunks(df, subset, seen, telemetry, stage):
+    # same as drop_duplicates on the whole file, given the keys of the rows kept from the previous chunks,
+    # with the rows discarded reported to the telemetry under stage
+    rows_in = len(df)
+    with telemetry.stage(stage) as stats:
+        keep = []
+        for values in df[subset].itertuples(index=False, name=None):
+            # missing values are all equal for drop_duplicates, and long strings are only kept as digests
+            key = tuple(None if pd.isna(value) else
+                        hashlib.sha1(value.encode('utf-8', 'surrogatepass')).digest() if isinstance(value, str) else
+                        value for value in values)
+            keep.append(key not in seen)
+            seen.add(key)
+        df = df[keep]
+    stats['rows_in'] += rows_in
+    stats['rows_out'] += len(df)
+    stats['rejections'][stage] = stats['rejections'].get(stage, 0) + rows_in - len(df)
+    return df
+
+
+def process_file_in_chunks(input_path, output_path, scratch_path, verdicts, t5_tokenizer, stopwords,
+                           parse_cache=None, workers=1, rows_per_chunk=10000, telemetry=None, language_backend=None,
+                           filter_order=None, checkpoint_interval=60.0):
+    # read, analyze and clean the raw file rows_per_chunk rows at a time, appending the results to output_path
+    telemetry = telemetry if telemetry is not None else Telemetry()
+    seen_methods = set()
+    seen_before = set()
+    rows_analyzed = 0
+    header = True
+    chunks_done = 0
+
+    # written outside the folder of the outputs and only moved there at the end, so that a file left half processed
+    # is neither skipped the next time nor read by the scripts using the processed files
+    temp_path = scratch_path + '.part'
+
+    # chunks processed so far, to continue from there if the run stops (e.g. GoogleApiError or out of memory),
+    # kept with the partial output
+    checkpoint = Checkpoint(scratch_path + '.checkpoint', checkpoint_interval)
+    input_stat = os.stat(input_path)
+    input_key = (input_stat.st_size, input_stat.st_mtime_ns, rows_per_chunk)
+    state = checkpoint.load()
+    if state is not None and state['input'] == input_key and \
+            (os.path.exists(temp_path) or state['output_size'] == 0):
+        chunks_done = state['chunks']
+        rows_analyzed = state['rows_analyzed']
+        header = state['header']
+        seen_methods = state['seen_methods']
+        seen_before = state['seen_before']
+        if os.path.exists(temp_path):
+            # drop the rows appended after the checkpoint, they are processed again
+            with open(temp_path, 'r+b') as f:
+                f.truncate(state['output_size'])
+        telemetry.set_value('resumed_from_chunk', chunks_done)
+        print(f'...Resuming after {chunks_done} chunks of {rows_per_chunk} rows')
+
+    # the same workers analyze all the chunks, so that they are started once and keep their parse caches
+    executor = create_executor(workers, parse_cache) if workers > 1 else None
+    try:
+        for i, df in enumerate(load_raw_data(input_path, 'analyze', chunksize=rows_per_chunk)):
+            if i < chunks_done:
+                continue
+
+            df = analyze_data(df, parse_cache, workers, telemetry=telemetry, executor=executor)
+
+            # number the rows as if the whole file was analyzed at once
+            df.index += rows_analyzed
+            rows_analyzed += len(df)
+
+            cleaner = Cleaner(df, t5_tokenizer, stopwords, verdicts, telemetry, language_backend, filter_order)
+            cleaner.clean_df()
+            df = drop_duplicates_across_chunks(cleaner.get_df(), METHOD_COLUMNS, seen_methods, telemetry,
+                                               'multiple_reviews')
+
+            # when a comment like "why null?" is processed, only null is left, and pandas interprets it as a NaN
+            df = df.reindex(columns=PROCESSED_COLUMNS).fillna('null')
+
+            # discard all the remaining duplicates
+            df = drop_duplicates_across_chunks(df, ["before"], seen_before, telemetry, 'duplicate_before')
+
+            if len(df) > 0:
+                df.to_csv(temp_path, mode='w' if header else 'a', header=header)
+                header = False
+
+            if checkpoint.is_due():
+                checkpoint.save({'input': input_key, 'chunks': i + 1, 'rows_analyzed': rows_analyzed, 'header': header,
+                                 'seen_methods': seen_methods, 'seen_before': seen_before,
+                                 'output_size': 0 if header else os.path.getsize(temp_path)})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if header:
+        # no instance survived, only write the header
+        pd.DataFrame(columns=Analyzer.OUTPUT_COLUMNS).to_csv(temp_path)
+
+    os.replace(temp_path, output_path)
+    checkpoint.remove()
+
+
+def init_file_worker(tokenizer_path, path_scratch):
+    global worker_tokenizer, worker_stopwords
+    worker_tokenizer = T5Tokenizer.from_pretrained(tokenizer_path)
+    worker_stopwords = get_lexicon()
+
+    # the files written in the working directory (e.g. undetected_language.csv) are kept apart for each process
+    path_worker = os.path.join(path_scratch, f'worker_{os.getpid()}')
+    os.makedirs(path_worker, exist_ok=True)
+    os.chdir(path_worker)
+
+
+def process_file_in_worker(file, options):
+    process_file(file, worker_tokenizer, worker_stopwords, **options)
+    return file
+
+
+def process_file(file, t5_tokenizer, stopwords, path_data_folder, path_processed_data, path_scratch, path_telemetry,
+                 verdicts, language_backend, filter_order, parse_cache, workers, rows_per_chunk, checkpoint_interval,
+                 profile):
+    print(f'Analyzing file: {file}')
+    output_path = os.path.join(path_processed_data, file)
+    # partial output of the file, on the same filesystem as the processed folder so that it is moved there atomically
+    scratch_path = os.path.join(path_scratch, file)
+
+    # check if file is empty
+    if os.path.getsize(os.path.join(path_data_folder, file)) == 0:
+        print(f'...File {file} is empty, skipping...')
+        shutil.copy(os.path.join(path_data_folder, file), path_processed_data)
+        return
+
+    telemetry = Telemetry()
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    if rows_per_chunk is not None:
+        process_file_in_chunks(os.path.join(path_data_folder, file), output_path, scratch_path,
+                               verdicts, t5_tokenizer, stopwords, parse_cache, workers,
+                               rows_per_chunk, telemetry, language_backend, filter_order, checkpoint_interval)
+    else:
+        # analyze and clean data
+        df = load_raw_data(os.path.join(path_data_folder, file), 'analyze')
+        df = analyze_data(df, parse_cache, workers, telemetry=telemetry)
+        df = clean_data(df, verdicts, t5_tokenizer, stopwords, telemetry, language_backend, filter_order)
+
+        # when a comment like "why null?" is processed, only null is left, and pandas interprets it as a NaN
+        df = df.fillna('null')
+
+        # discard all the remaining duplicates
+        rows_in = len(df)
+        with telemetry.stage('duplicate_before') as stats:
+            df = df.drop_duplicates(subset=["before"])
+        stats['rows_in'] += rows_in
+        stats['rows_out'] += len(df)
+        stats['rejections']['duplicate_before'] = rows_in - len(df)
+
+        # save data to processed folder, moved there once complete
+        df.to_csv(scratch_path + '.part')
+        os.replace(scratch_path + '.part', output_path)
+
+    report_path = os.path.join(path_telemetry, os.path.splitext(file)[0])
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(report_path + '.prof')
+    report = telemetry.save(report_path)
+    parse_stats = parse_cache.get_stats() if parse_cache is not None else None
+    print(f'...Parse cache: {parse_stats}, language verdicts: {verdicts.get_stats()}')
+    if report.get('filters', {}).get('rows_per_second') is not None:
+        print(f'...Filters in the order {report["filters"]["order"]}: '
+              f'{report["filters"]["rows_per_second"]:.0f} rows/s, '
+              f'{report["filters"]["default_rows_per_second"]:.0f} rows/s in the default order')
+    print(f'...Done with {file} in {report["seconds"]:.1f}s, see {report_path}.json')
+
+
 def main():
-    path_data_folder = '../data'
+    # absolute paths, the processes of the file driver work in their own folders
+    path_data_folder = os.path.abspath('../data')
     path_processed_data = os.path.join(path_data_folder, 'processed')  # processed data folder path
     if not os.path.exists(path_processed_data):
         os.mkdir(path_processed_data)
 
+    # partial outputs and checkpoints of the files being processed, only complete outputs go to the processed folder
+    path_scratch = os.path.join(path_data_folder, 'scratch')
+    if not os.path.exists(path_scratch):
+        os.mkdir(path_scratch)
+
+    # the largest files first, so that the processes of the file driver end at about the same time
     files = [file for file in os.listdir(path_data_folder)
              if file not in os.listdir(path_processed_data)
              and (file.endswith('.csv') and not file.endswith('_summary.csv') and not file.endswith('_stats.csv'))]
+    files.sort(key=lambda file: os.path.getsize(os.path.join(path_data_folder, file)), reverse=True)
 
-    t5_tokenizer = T5Tokenizer.from_pretrained("../tokenizer/TokenizerModel.model")
-    stopwords = get_stopwords()
+    tokenizer_path = os.path.abspath("../tokenizer/TokenizerModel.model")
 
-    for file in tqdm(files):
-        print(f'Analyzing file: {file}')
+    # language verdicts of the comments, with the ones of the previous runs kept in english_real_predictions.tsv
+    verdicts = VerdictStore(os.path.abspath('english_real_predictions.sqlite'))
+    verdicts.import_tsv('english_real_predictions.tsv')
 
-        # check if file is empty
-        if os.path.getsize(os.path.join(path_data_folder, file)) == 0:
-            print(f'...File {file} is empty, skipping...')
-            shutil.copy(os.path.join(path_data_folder, file), path_processed_data)
-            continue
+    # asked about the comments no local classifier is sure are english,
+    # replace it with StandInBackend to run offline (e.g. StandInBackend(latency=0.2) to mimic Google)
+    language_backend = GoogleBackend()
 
-        # read tsv of previous language predictions
-        open('english_real_predictions.tsv', 'a').close()
-        df_previous_predictions = pd.read_csv('english_real_predictions.tsv', sep='\t',
-                                              names=['comment', 'confidence', 'lang'],
-                                              quoting=csv.QUOTE_NONE)
+    # order of the filters of the Cleaner (names of Cleaner.FILTERS), None to adapt it to the cost and the rows
+    # discarded by each filter in the previous chunks of the file
+    filter_order = None
 
-        # analyze and clean data
-        df = pd.read_csv(os.path.join(path_data_folder, file), index_col=0)
-        df = analyze_data(df)
-        df = clean_data(df, df_previous_predictions, t5_tokenizer, stopwords)
+    # lizard parses of the file contents, kept on disk to skip parsing when analyzing the data again
+    parse_cache = ParseCache(path=os.path.join(path_data_folder, 'parse_cache'))
 
-        # when a comment like "why null?" is processed, only null is left, and pandas interprets it as a NaN
-        df = df.fillna('null')
+    # number of files processed at the same time, each one by its own process with its own tokenizer
+    file_workers = 1
 
-        # discard all the remaining duplicates
-        df = df.drop_duplicates(subset=["before"])
+    # number of processes analyzing the rows of each file
+    workers = max(1, os.cpu_count() // file_workers)
+
+    # number of rows of the raw files read at a time, None to read each file at once
+    rows_per_chunk = 10000
+
+    # seconds between the checkpoints of the chunks processed, to resume a file from the last one
+    checkpoint_interval = 60.0
+
+    # time and rows discarded by each stage, saved for each file as JSON and CSV in the telemetry folder
+    path_telemetry = os.path.join(path_data_folder, 'telemetry')
+    if not os.path.exists(path_telemetry):
+        os.mkdir(path_telemetry)
+
+    # also dump the cProfile stats of each file to the telemetry folder
+    profile = False
 
-        # save data to processed folder
-        df.to_csv(os.path.join(path_processed_data, file))
+    options = {'path_data_folder': path_data_folder, 'path_processed_data': path_processed_data,
+               'path_scratch': path_scratch, 'path_telemetry': path_telemetry, 'verdicts': verdicts,
+               'language_backend': language_backend, 'filter_order': filter_order, 'parse_cache': parse_cache,
+               'workers': workers, 'rows_per_chunk': rows_per_chunk, 'checkpoint_interval': checkpoint_interval,
+               'profile': profile}
 
-        # remove unnecessary files
-        os.remove('start.java')
-        os.remove('before.java')
-        os.remove('after.java')
+    if file_workers == 1:
+        t5_tokenizer = T5Tokenizer.from_pretrained(tokenizer_path)
+        stopwords = get_lexicon()
+        for file in tqdm(files):
+            process_file(file, t5_tokenizer, stopwords, **options)
+    else:
+        # undetected_language.csv of each process is in its folder in data/scratch
+        with ProcessPoolExecutor(max_workers=file_workers, initializer=init_file_worker,
+                                 initargs=(tokenizer_path, path_scratch)) as executor:
+            futures = [executor.submit(process_file_in_worker, file, options) for file in files]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                future.result()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,506 @@
+import codecs
+import functools
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+import pandas as pd
+import regex
+from replication.Analyzer import Analyzer, create_executor
+from replication.Cleaner import Cleaner, PATTERNS
+from replication.LanguageBackend import StandInBackend
+from replication.RelevanceMatcher import IRRELEVANCE_RULES, IRRELEVANT_COMMENTS, RelevanceMatcher
+from replication.ParseCache import ParseCache
+from replication.ParsedSource import ParsedSource
+from replication.create_datasets import WHITESPACE, clean, clean_column
+from utils.emojis import EMOJI_REGEX
+from utils.raw_data import STAGE_COLUMNS, load_raw_data
+from utils.stopwords import get_lexicon, get_stopwords
+
+
+def generate_java_file(n_lines, seed=0):
+    rnd = random.Random(seed)
+    lines = ['package benchmark;', '', 'public class Benchmark {']
+    m = 0
+    while len(lines) < n_lines:
+        lines.append(f'    public int method{m}(int a, String b) {{')
+        for i in range(rnd.randint(5, 40)):
+            lines.append(f'        int value{i} = a + b.length() * {i};')
+        lines.append('        return a;')
+        lines.append('    }')
+        lines.append('')
+        m += 1
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_raw_dump(n_rows, n_files=50, file_lines=800, seed=0):
+    # GitHub review comments with the columns of the raw data, a few dozens of comments per file revision
+    rnd = random.Random(seed)
+    contents = [generate_java_file(file_lines, seed=seed + i) for i in range(n_files)]
+    comments = ['Please rename this variable', 'why null?', 'nit: use a constant here instead', 'LGTM',
+                'Could you extract this into a separate method please?', 'see http://example.com/docs for details']
+    rows = []
+    for i in range(n_rows):
+        f = rnd.randrange(n_files)
+        line = rnd.randint(1, file_lines)
+        rows.append({'project': f'owner/project{f % 5}', 'pull_id': 1000 + f, 'pull_number': f,
+                     'filename': f'src/main/java/File{f}.java', 'commit_before': f'before{f}',
+                     'commit_while': f'while{f}', 'user_id': rnd.randint(1, 20), 'owner_id': rnd.randint(1, 20),
+                     'message': rnd.choice(comments), 'created_at': f'2020-01-{1 + i % 28:02d}T10:00:00Z',
+                     'original_start_line': float('nan'), 'original_line': line, 'url': f'https://github.com/{f}',
+                     'file_content_before': contents[(f + 1) % n_files], 'file_content_while': contents[f],
+                     'file_content_after': contents[(f + 2) % n_files]})
+    return pd.DataFrame(rows)
+
+
+def generate_strings(n_strings, seed=0):
+    # comments and lines of code, mostly ASCII, some with emoji, links, accents or Java comments
+    rnd = random.Random(seed)
+    words = ['please', 'rename', 'this', 'variable', 'why', 'null?', 'use', 'a', 'constant', 'here', 'LGTM', 'nit:',
+             'int', 'value', '=', 'a.length();', 'return', 'b;', '{', '}', '//', 'TODO', '/*', '*/', '<END>',
+             'http://example.com/docs', 'https://github.com/owner/project/pull/1', 'è', 'perché', '👍', '😀',
+             '👩\u200d\u2764\ufe0f\u200d\U0001f48b\u200d\U0001f468', '#\ufe0f\u20e3', '\\', '\u2122']
+    weights = [20] * 25 + [2, 2, 1, 1, 1, 1, 1, 1, 1, 1]
+    return [' '.join(rnd.choices(words, weights, k=rnd.randint(1, 30))) for _ in range(n_strings)]
+
+
+def timeit(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_parsed_source(n_lines=6000, n_comments=200):
+    """Compare one ParsedSource per file with splitting the file again in every check."""
+    text = generate_java_file(n_lines)
+    start = time.perf_counter()
+    functions = ParsedSource.from_text('before.java', text).function_list
+    parse = time.perf_counter() - start
+    rnd = random.Random(0)
+    refs = [[f.start_line + 1, f.start_line + 1] for f in rnd.choices(functions, k=n_comments)]
+
+    def load(filename):
+        # lizard runs once per file and row in both cases, so its result is shared to time only the line handling
+        source = ParsedSource.from_text(filename, text)
+        source._function_list = functions
+        return source
+
+    def extract_method_per_line(liz_elem, code):
+        # extract_method before ParsedSource: the same slice is recomputed once per line of the file
+        method_extracted = []
+        for k in range(len(code)):
+            method_extracted = code[liz_elem.start_line - 1: liz_elem.end_line]
+        return method_extracted
+
+    def per_check():
+        for ref in refs:
+            Analyzer.check_len_code(ref[0], ref[1], load('before.java'))
+            Analyzer.check_comment_to_comment(ref[0], ref[1], load('before.java'))
+            found = Analyzer.search_before_method(ref, load('before.java'))
+            extract_method_per_line(found[0], load('before.java').lines)
+            Analyzer.extract_marked_method(found[0], ref, 'GitHub', load('before.java'))
+            after = Analyzer.search_method(found[0].long_name, 'after.java', load('after.java'))
+            extract_method_per_line(after[0], load('after.java').lines)
+
+    def parse_once():
+        for ref in refs:
+            before = load('before.java')
+            after = load('after.java')
+            Analyzer.check_len_code(ref[0], ref[1], before)
+            Analyzer.check_comment_to_comment(ref[0], ref[1], before)
+            found = Analyzer.search_before_method(ref, before)
+            Analyzer.extract_method(found[0], 'before.java', before)
+            Analyzer.extract_marked_method(found[0], ref, 'GitHub', before)
+            after_found = Analyzer.search_method(found[0].long_name, 'after.java', after)
+            Analyzer.extract_method(after_found[0], 'after.java', after)
+
+    old = timeit(per_check)
+    new = timeit(parse_once)
+    print(f'ParsedSource ({n_lines} lines, {n_comments} rows, lizard parse {parse:.3f}s per file): '
+          f'per check {old:.3f}s, parse once {new:.3f}s, speedup {old / new:.1f}x')
+
+
+def benchmark_marking(n_lines=6000, n_methods=50, comments_per_method=10):
+    """Compare marking each comment with a scan of the whole file with the method-scoped engine."""
+    source = ParsedSource.from_text('before.java', generate_java_file(n_lines))
+    rnd = random.Random(0)
+    marks = []
+    for f in rnd.sample(source.function_list, min(n_methods, len(source.function_list))):
+        for _ in range(comments_per_method):
+            line = rnd.randint(f.start_line, f.end_line)
+            marks.append((f, [line, line, 0, 0], False))
+
+    def mark_per_file_scan(liz_elem, ref, code):
+        # extract_marked_method_github before the engine: every line of the file is visited for each comment
+        flag_marked = False
+        method_extracted_marked = []
+        for k in range(len(code)):
+            if liz_elem.start_line - 1 <= k <= liz_elem.end_line - 1:
+                current_line = code[k][:-1] if code[k].endswith('\n') else code[k]
+                if k + 1 == ref[0]:
+                    current_line = '<START> ' + current_line
+                if k + 1 == ref[1] and not flag_marked:
+                    current_line += ' <END> '
+                    flag_marked = True
+                method_extracted_marked.append(current_line)
+        return method_extracted_marked, flag_marked
+
+    def per_file_scan():
+        return [mark_per_file_scan(liz_elem, ref, source.lines) for liz_elem, ref, _ in marks]
+
+    def method_scoped():
+        source._method_lines = {}
+        return Analyzer.mark_methods(source, marks)
+
+    assert per_file_scan() == method_scoped()
+    old = timeit(per_file_scan)
+    new = timeit(method_scoped)
+    print(f'Marking ({n_lines} lines, {len(marks)} comments on {len(marks) // comments_per_method} methods): '
+          f'per file scan {old:.3f}s, method scoped {new:.3f}s, speedup {old / new:.1f}x')
+
+
+def check_emoji_pattern():
+    # every code point and the emoji sequences, alone and next to each other, are removed as by the list of emoji
+    emoji_list = regex.compile(EMOJI_REGEX)
+    for code in range(0x110000):
+        assert Cleaner.remove_emojis(chr(code)) == emoji_list.sub(r' ', chr(code)), hex(code)
+
+    emojis = [codecs.decode(alternative[3:] if alternative.startswith('\\\\*') else alternative, 'unicode_escape')
+              for alternative in EMOJI_REGEX.split('|')]
+    assert not any(emoji.isascii() for emoji in emojis)
+    pieces = emojis + [emoji[:-1] for emoji in emojis if len(emoji) > 1] + ['\\', '#', '*', '1', 'a', ' ', 'è']
+    rnd = random.Random(0)
+    for text in pieces + [''.join(rnd.choices(pieces, k=rnd.randint(2, 6))) for _ in range(200000)]:
+        assert Cleaner.remove_emojis(text) == emoji_list.sub(r' ', text), repr(text)
+    print(f'Emoji: same output as the list of {len(emojis)} emoji for all the code points and sequences')
+
+
+def benchmark_cleaner_patterns(n_strings=1000000):
+    """Compare the Cleaner helpers compiling their patterns at each call with the compiled pattern registry."""
+    check_emoji_pattern()
+    strings = generate_strings(n_strings)
+
+    def remove_emojis(s):
+        return regex.compile(EMOJI_REGEX).sub(r' ', s)
+
+    def remove_comments(s):
+        s = regex.compile(r"/\*([^*]|[\r\n]|(\*+([^*/]|[\r\n])))*\*+/").sub(r' ', s)
+        s = regex.compile(r"(?<!:)\/\/.*?(?=END)").sub(r' ', s)
+        return regex.compile(r"(?<!:)\/\/.*").sub(r' ', s)
+
+    def replace_links(s):
+        link_pattern = regex.compile(PATTERNS['link'].pattern)
+        for idx, val in enumerate(set(m.group() for m in link_pattern.finditer(s))):
+            s = s.replace(val, "<LINK_" + str(idx) + ">")
+        return s
+
+    def is_non_latin(s):
+        return bool(regex.search(r'[^\x00-\x7F]+', s))
+
+    for name, old, new in [('remove_emojis', remove_emojis, Cleaner.remove_emojis),
+                           ('remove_comments', remove_comments, Cleaner.remove_comments),
+                           ('replace_links', replace_links, lambda s: Cleaner.replace_links(s)[0]),
+                           ('is_non_latin', is_non_latin, Cleaner.is_non_latin)]:
+        assert [old(s) for s in strings[:10000]] == [new(s) for s in strings[:10000]]
+        old_time = timeit(lambda: [old(s) for s in strings], repeat=1)
+        new_time = timeit(lambda: [new(s) for s in strings], repeat=1)
+        print(f'{name} ({n_strings} strings): compiled at each call {old_time:.2f}s, registry {new_time:.2f}s, '
+              f'speedup {old_time / new_time:.1f}x')
+
+
+def benchmark_raw_loading(n_rows=5000):
+    """Compare the memory of the whole raw dump with the columns loaded by each stage."""
+    path = os.path.join(tempfile.mkdtemp(), 'raw.csv')
+    generate_raw_dump(n_rows).to_csv(path)
+
+    full = pd.read_csv(path, index_col=0).memory_usage(deep=True).sum()
+    print(f'Raw dump ({n_rows} rows): all columns {full / 2 ** 20:.1f} MiB')
+    for stage in STAGE_COLUMNS:
+        if not set(STAGE_COLUMNS[stage]).issubset(pd.read_csv(path, nrows=0).columns):
+            continue
+        loaded = load_raw_data(path, stage).memory_usage(deep=True).sum()
+        print(f'...{stage}: {loaded / 2 ** 20:.1f} MiB, {100 * (1 - loaded / full):.1f}% saved')
+
+    os.remove(path)
+
+
+def benchmark_parse_cache(n_rows=6000, rows_per_chunk=1000, workers=4):
+    """Compare a pool of workers for each chunk of a raw dump with one pool for all the chunks."""
+    path = os.path.join(tempfile.mkdtemp(), 'raw.csv')
+    generate_raw_dump(n_rows).to_csv(path)
+    raw = pd.read_csv(path, index_col=0)
+    contents = len(set(raw['file_content_before']) | set(raw['file_content_while']) | set(raw['file_content_after']))
+
+    def analyze_chunks(parse_cache, executor=None):
+        # the chunks are streamed as in analyze_data.process_file_in_chunks
+        for df in load_raw_data(path, 'analyze', chunksize=rows_per_chunk):
+            analyzer = Analyzer(df, 'GitHub', in_memory=True, parse_cache=parse_cache, executor=executor)
+            analyzer.remove_invalid_data(workers)
+
+    pool_per_chunk = ParseCache()
+    old_time = timeit(lambda: analyze_chunks(pool_per_chunk), repeat=1)
+    shared_pool = ParseCache()
+    with create_executor(workers, shared_pool) as executor:
+        new_time = timeit(lambda: analyze_chunks(shared_pool, executor), repeat=1)
+
+    # each worker parses each content at most once, however many chunks it is in
+    assert shared_pool.misses <= workers * contents, shared_pool.get_counters()
+    print(f'Parse cache ({n_rows} rows in chunks of {rows_per_chunk}, {contents} contents, {workers} workers): '
+          f'pool per chunk {pool_per_chunk.misses} parses {old_time:.2f}s, '
+          f'one pool {shared_pool.misses} parses {new_time:.2f}s, speedup {old_time / new_time:.1f}x')
+
+    os.remove(path)
+
+
+def benchmark_language_backend(n_texts=500, latency=0.05):
+    """Compare one request for each comment with the batched requests, with the latency of a remote service."""
+    texts = [f'commento numero {i} sul metodo' for i in range(n_texts)]
+    one_by_one = StandInBackend(latency=latency, batch_size=1, concurrency=1)
+    batched = StandInBackend(latency=latency)
+
+    old_time = timeit(lambda: [one_by_one.detect([text])[0] for text in texts], repeat=1)
+    new_time = timeit(lambda: batched.detect(texts), repeat=1)
+    print(f'Language detection ({n_texts} texts, {latency * 1000:.0f}ms per request): one by one {old_time:.2f}s, '
+          f'batches of {batched.batch_size} with {batched.concurrency} requests at a time {new_time:.2f}s, '
+          f'speedup {old_time / new_time:.1f}x')
+
+
+def generate_comments(n_comments, seed=0):
+    # short review comments, made of the texts of the relevance rules, stopwords and other words
+    rnd = random.Random(seed)
+    words = sorted({text for _, _, groups in IRRELEVANCE_RULES for group in groups for text in group})
+    words += IRRELEVANT_COMMENTS + ['the', 'a', 'is', 'it', 'of', 'Why', 'Rename', 'variable', 'null', 'method',
+                                    'PR', 'Done.', 'here?', 'latest', 'address', 'seeing', 'LGTM!', '<LINK_0>', 'Ok']
+    return [' '.join(rnd.choice(words) for _ in range(rnd.choice([0, 1, 1, 2, 2, 3, 4, 5, 8])))
+            for _ in range(n_comments)]
+
+
+def is_comment_relevant(comment, remove_stopwords):
+    # Cleaner.is_comment_relevant before RelevanceMatcher, one comment at a time
+    comment = comment.lower()
+    size = len(comment.split())
+
+    if size == 0:
+        return False
+
+    if len(remove_stopwords(comment)) == 0:
+        return False
+
+    if comment == ":+1:" or comment == "+1" or \
+            comment == "\+" or \
+            comment == ":100:" or comment == "..." or \
+            comment == "!!!" or comment == "==>" or \
+            comment == "++" or \
+            comment == "??" or comment == "-;" or \
+            comment == "... :)" or comment == "+" or \
+            comment == ";)" or comment == ":0" or \
+            comment == ":-)" or comment == ":0" or \
+            comment == ";-)" or comment == ":(" or \
+            comment == ":-(" or comment == "?!" or \
+            comment == "^^" or comment == "^^^" or \
+            comment == "???" or comment == ":/" or \
+            comment == "+:100:" or comment == "????" or \
+            comment == "..?" or comment == ":-|" or \
+            comment == "...?" or comment == "??????" or \
+            comment == ":)" or comment == "^":
+        return False
+
+    # Useless comments, one word, no action required or unclear action
+    if size == 1:
+        if "done" in comment or "idem" in comment or \
+                "lgtm" in comment or "docs" in comment or \
+                "ok" in comment or "nice" in comment or \
+                "pleas" in comment or "ditto" in comment or \
+                "thank" in comment or "lol" in comment or \
+                "fine" in comment or "agre" in comment or \
+                "dito" in comment or "yeh" in comment or \
+                "cool" in comment or "same" in comment or \
+                "ack" in comment or "hahaha" in comment:
+            return False
+
+    if size == 2:
+        if "ack" in comment or \
+                "same change" in comment or "this too" in comment or \
+                "java doc" in comment or \
+                "good catch" in comment or "and this" in comment:
+            return False
+
+    # as above, see above, ditto above, same above,
+    # same here, and here, also here, here too, ditto here, here..., likewise here.
+    if size <= 3:
+        if "here" in comment or "above" in comment:
+            return False
+
+    # Request to change formatting, no impact on code
+    if "indent" in comment and size < 5:
+        return False
+
+    # Likely a thank you message
+    if ("works for me" in comment or "sounds good" in comment or "makes sense" in comment or "smile" in comment
+        or "approv" in comment) and size < 5:
+        return False
+
+    # Request to add test code, no impact on the reviewed code
+    if ("test" in comment and size < 5) or ("add" in comment and "test" in comment):
+        return False
+
+    # Request for clarification
+    if (("please explain" in comment or "what" in comment or "wat" in comment or "explan" in comment) and size < 5) \
+            or ("not sure" in comment and ("understand" in comment or "meant" in comment)):
+        return False
+
+    # Refers to previous comment or external resource with unclear action point
+    if ("same as" in comment or "same remark" in comment or "said above" in comment or "do the same" in comment) \
+            and size < 5:
+        return False
+
+    if ("like" in comment or "see" in comment) and ("http" in comment or "https" in comment or "<link_" in comment):
+        return False
+
+    # Request to add comment
+    if "document" in comment or "javadoc" in comment or "comment" in comment:
+        return False
+
+    # Feedback about reorganizing the PR
+    if "pr" in comment and size < 5:
+        return False
+
+    # Comment contains a +1 to support previous comment.
+    # It may be accompanied by another word, like agree or a smile.
+    # This is the reason for < 3
+    if "+1" in comment and size < 3:
+        return False
+
+    # The code is ok for now
+    if "for now" in comment and size < 5:
+        return False
+
+    # Answers
+    if ("fixed" in comment or "thank" in comment or "youre right" in comment) and size < 3:
+        return False
+
+    return True
+
+
+def benchmark_relevance(n_comments=200000):
+    """Compare the rules checked one comment at a time with RelevanceMatcher on the whole column."""
+    comments = generate_comments(n_comments)
+    cleaner = types.SimpleNamespace(stopwords=get_lexicon(), trim_punctuation=Cleaner.trim_punctuation)
+    remove_stopwords = functools.partial(Cleaner.remove_stopwords, cleaner)
+    remove_stopwords_column = functools.partial(Cleaner.remove_stopwords_column, cleaner)
+    matcher = RelevanceMatcher()
+    assert [is_comment_relevant(c, remove_stopwords) for c in comments] == \
+           list(matcher.get_relevant(comments, remove_stopwords_column))
+
+    old_time = timeit(lambda: [is_comment_relevant(c, remove_stopwords) for c in comments], repeat=1)
+    new_time = timeit(lambda: matcher.get_relevant(comments, remove_stopwords_column), repeat=1)
+    print(f'Relevance ({n_comments} comments): one at a time {old_time:.2f}s, whole column {new_time:.2f}s, '
+          f'speedup {old_time / new_time:.1f}x')
+
+
+def remove_stopwords(text, stopwords):
+    # Cleaner.remove_stopwords before StopwordLexicon, looking for each word in the list of stopwords
+    text = ''.join(w + ' ' for w in text.split() if w.upper() not in stopwords).strip()
+
+    if text.endswith(("?", "!", ".")):
+        text = text[:-1]
+
+    if text.startswith(('-', '.', ':', '>')):
+        text = text[1:].strip()
+
+    return text
+
+
+def benchmark_stopwords(n_comments=100000):
+    """Compare the list of stopwords with StopwordLexicon on a whole column of comments."""
+    comments = generate_comments(n_comments)
+    stopwords = get_stopwords()
+    cleaner = types.SimpleNamespace(stopwords=get_lexicon(), trim_punctuation=Cleaner.trim_punctuation)
+    assert [remove_stopwords(c, stopwords) for c in comments] == Cleaner.remove_stopwords_column(cleaner, comments)
+
+    old_time = timeit(lambda: [remove_stopwords(c, stopwords) for c in comments], repeat=1)
+    new_time = timeit(lambda: Cleaner.remove_stopwords_column(cleaner, comments))
+    print(f'Stopwords ({n_comments} comments): list {old_time:.2f}s, lexicon {new_time:.2f}s, '
+          f'speedup {old_time / new_time:.1f}x')
+
+
+def generate_merged_frame(n_rows, n_distinct=10000, seed=0):
+    # rows of the processed files as merged by merge_data, drawn from n_distinct comments and methods
+    rnd = random.Random(seed)
+    comments = generate_strings(n_distinct, seed)
+    java_lines = generate_java_file(2000, seed).split('\n')
+    methods = []
+    for _ in range(n_distinct):
+        start = rnd.randrange(len(java_lines) - 40)
+        method = '\n'.join(java_lines[start:start + rnd.randint(5, 40)])
+        # some methods were saved with escaped new lines and tabs
+        methods.append(method.replace('\n', '\\n').replace('    ', '\\t') if rnd.random() < 0.1 else method)
+    return pd.DataFrame({'pull_num': [rnd.randint(1, 10000) for _ in range(n_rows)],
+                         'comment': rnd.choices(comments, k=n_rows),
+                         'created_at': [f'2021-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T10:00:00Z'
+                                        for _ in range(n_rows)],
+                         'before': rnd.choices(methods, k=n_rows),
+                         'before_lines': [rnd.randint(1, 500) for _ in range(n_rows)]})
+
+
+def benchmark_clean(n_rows=1000000):
+    """Compare clean applied to each cell with clean_column on each column of a merged frame."""
+    df = generate_merged_frame(n_rows)
+
+    def old_clean(string):
+        string = str(string).strip()
+        string = string.replace('\n', ' ')
+        string = string.replace('\\n', ' ')
+        string = string.replace('\t', ' ')
+        string = string.replace('\\t', ' ')
+        string = re.sub(r'\s+', ' ', string)
+        return string
+
+    for column in df.columns:
+        assert df[column].apply(old_clean).tolist() == clean_column(df[column])
+    strings = generate_strings(10000) + ['\\n'.join(df['before'][:1000])]
+    assert [old_clean(s) for s in strings] == [clean(s) for s in strings]
+
+    def string_methods(column):
+        # the same steps with the pandas string methods, not used by clean_column as they are slower
+        return column.astype(str).str.strip().str.replace(WHITESPACE, ' ', regex=True).tolist()
+
+    for column in df.columns:
+        assert string_methods(df[column]) == clean_column(df[column])
+
+    old_time = timeit(lambda: [df[column].apply(old_clean) for column in df.columns], repeat=1)
+    new_time = timeit(lambda: [clean_column(df[column]) for column in df.columns], repeat=1)
+    methods_time = timeit(lambda: [string_methods(df[column]) for column in df.columns], repeat=1)
+    print(f'Clean ({n_rows} rows, {len(df.columns)} columns): each cell {old_time:.2f}s, '
+          f'each column {new_time:.2f}s, speedup {old_time / new_time:.1f}x '
+          f'(pandas string methods {methods_time:.2f}s)')
+
+
+BENCHMARKS = {
+    'parsed_source': benchmark_parsed_source,
+    'marking': benchmark_marking,
+    'cleaner_patterns': benchmark_cleaner_patterns,
+    'raw_loading': benchmark_raw_loading,
+    'parse_cache': benchmark_parse_cache,
+    'language_backend': benchmark_language_backend,
+    'relevance': benchmark_relevance,
+    'stopwords': benchmark_stopwords,
+    'clean': benchmark_clean,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS.keys():
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,11 +1,23 @@
 import csv
+import json
 import os
 import re
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from sklearn.model_selection import train_test_split
 
 
-def merge_data(data_folder, columns=None, with_merge_info=False):
+# strings read as missing values by pd.read_csv, and as booleans
+NA_STRINGS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+              'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+BOOLEAN_STRINGS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+# whitespace, new lines and tabs, also escaped, replaced by a single space by clean
+WHITESPACE = re.compile(r'(?:\s|\\[nt])+')
+
+
+def merge_data(data_folder, columns=None, with_merge_info=False, merge_file="merged.csv"):
     def clean_and_drop_duplicates(df):
         df['comment'].fillna("null", inplace=True)
         df['comment_no_stopwords'].fillna("null", inplace=True)
@@ -13,52 +25,142 @@ def merge_data(data_folder, columns=None, with_merge_info=False):
         df.drop_duplicates(subset=['before'], inplace=True)
         return df
 
-    merge_file = "merged.csv"
-    if os.path.exists(merge_file):
-        return clean_and_drop_duplicates(pd.read_csv(merge_file))
-
     if columns is None:
         columns = ['project', 'pull_num', 'commit_before', 'commit_while', 'filename', 'method_name', 'comment',
                    'created_at', 'start', 'before', 'before_marked', 'after', 'comment_no_stopwords', 'start_lines',
                    'before_lines', 'before_marked_lines']
     if with_merge_info:
-        columns += ['merged']
-
-    merged_df = pd.DataFrame(columns=columns)
-
-    files = [file for file in os.listdir(data_folder)]
-    for file in files:
-        filepath = os.path.join(data_folder, file)
-
-        # skip if file is empty
-        if os.path.getsize(filepath) == 0:
+        columns = columns + ['merged']
+
+    # name, size and modification time of the files to merge, in the order they are merged
+    files = []
+    for file in sorted(os.listdir(data_folder)):
+        stat = os.stat(os.path.join(data_folder, file))
+        files.append([file, stat.st_size, stat.st_mtime_ns])
+
+    # merge_file is reused if it has the same columns of the same folder, and its files did not change,
+    # only the files added since are cleaned and appended
+    manifest_file = merge_file + '.json'
+    manifest = load_manifest(manifest_file)
+    if is_valid_merge(merge_file, manifest, data_folder, columns, files):
+        merged_df = pd.read_csv(merge_file, dtype=str, keep_default_na=False)
+    else:
+        manifest = {'data_folder': os.path.abspath(data_folder), 'columns': columns, 'files': [], 'size': 0}
+        merged_df = pd.DataFrame(columns=columns)
+        merged_df.to_csv(merge_file, index=False)
+
+    # each file is cleaned on its own and all of them are concatenated once at the end
+    merged_files = {file for file, _, _, _ in manifest['files']}
+    file_dfs = []
+    for file, size, modified in files:
+        if file in merged_files:
             continue
-
-        file_df = pd.read_csv(filepath)
-        try:
-            merged_df = pd.concat([merged_df, file_df[columns]])
-        except KeyError:
-            # columns are invalid e.g. if the file was not processed
-            # as it only contains the header
+        file_df = read_and_clean(os.path.join(data_folder, file), columns)
+        manifest['files'].append([file, size, modified, len(file_df)])
+        if len(file_df) > 0:
+            file_dfs.append(file_df)
+
+    if len(file_dfs) > 0:
+        new_df = pd.concat(file_dfs, ignore_index=True)
+        new_df.to_csv(merge_file, mode='a', header=False, index=False)
+        merged_df = pd.concat([merged_df, new_df], ignore_index=True) if len(merged_df) > 0 else new_df
+    manifest['size'] = os.path.getsize(merge_file)
+    save_manifest(manifest_file, manifest)
+
+    # the rows in the order of the files, as if all of them were merged at once
+    merged_df = merged_df.iloc[get_file_order(manifest['files'])].reset_index(drop=True)
+
+    # the values that would be read from the file, e.g. nan values which where converted to string
+    return clean_and_drop_duplicates(parse_strings(merged_df))
+
+
+def read_and_clean(filepath, columns):
+    # cleaned strings of the columns of a processed file
+    # skip if file is empty
+    if os.path.getsize(filepath) == 0:
+        return pd.DataFrame(columns=columns)
+
+    file_df = pd.read_csv(filepath)
+    if any(column not in file_df.columns for column in columns):
+        # columns are invalid e.g. if the file was not processed
+        # as it only contains the header
+        return pd.DataFrame(columns=columns)
+
+    return pd.DataFrame({column: clean_column(file_df[column]) for column in columns})
+
+
+def load_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return None
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest_file, manifest):
+    # written to a temp file first, so that an interrupted write never leaves a partial manifest
+    temp_file = f'{manifest_file}.{os.getpid()}.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_file, manifest_file)
+
+
+def is_valid_merge(merge_file, manifest, data_folder, columns, files):
+    if manifest is None or not os.path.exists(merge_file):
+        return False
+    if manifest['data_folder'] != os.path.abspath(data_folder) or manifest['columns'] != columns:
+        return False
+    # e.g. a merge interrupted while appending
+    if os.path.getsize(merge_file) != manifest['size']:
+        return False
+    # the files merged must all be unchanged, otherwise their rows have to be merged again
+    current = {file: [size, modified] for file, size, modified in files}
+    return all(current.get(file) == [size, modified] for file, size, modified, _ in manifest['files'])
+
+
+def get_file_order(merged_files):
+    # positions of the rows of merged_files (name, size, modification time, rows) in the order of their names
+    starts = np.cumsum([0] + [rows for _, _, _, rows in merged_files])
+    order = sorted(range(len(merged_files)), key=lambda i: merged_files[i][0])
+    return np.concatenate([np.arange(starts[i], starts[i + 1]) for i in order] + [np.zeros(0, dtype=np.int64)])
+
+
+def parse_strings(df):
+    # same values and types as writing the strings of df to a CSV file and reading it again with pd.read_csv
+    if len(df) == 0:
+        # read as empty columns of objects
+        return df
+    df = df.mask(df.isin(NA_STRINGS))
+    for column in df.columns:
+        values = df[column].dropna()
+        if len(values) > 0 and values.isin(BOOLEAN_STRINGS.keys()).all():
+            df[column] = df[column].map(BOOLEAN_STRINGS)
             continue
-
-    for column in merged_df.columns:
-        merged_df[column] = merged_df[column].apply(clean)
-
-    merged_df.to_csv(merge_file, index=False)
-
-    # read from file to handle nan values which where converted to string
-    return clean_and_drop_duplicates(pd.read_csv(merge_file))
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            pass
+    return df
 
 
 def clean(string):
     string = str(string).strip()
-    string = string.replace('\n', ' ')
-    string = string.replace('\\n', ' ')
-    string = string.replace('\t', ' ')
-    string = string.replace('\\t', ' ')
-    string = re.sub(r'\s+', ' ', string)
-    return string
+    if '\\' in string:
+        # the escaped new lines and tabs are also replaced by a space
+        return WHITESPACE.sub(' ', string)
+    # same as replacing each run of whitespace with a space
+    return ' '.join(string.split())
+
+
+def clean_column(column):
+    # clean on each value of a pandas column, numbers and booleans only need to be converted to strings.
+    # The strings are still cleaned one at a time: the pandas string methods (strip, then replace with WHITESPACE)
+    # give the same values but run the regex on every cell, and are about 4x slower than str.split in clean
+    if is_numeric_dtype(column):
+        return column.to_numpy().astype(str).tolist()
+    return [clean(value) for value in column]
 
 
 def tag_code_and_comment_input(df):
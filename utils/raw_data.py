@@ -0,0 +1,56 @@
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+# columns of the raw review dumps read by each stage, the file contents are only read by the stages that need them
+STAGE_COLUMNS = {
+    # replication/analyze_data.py (Analyzer with GitHub data)
+    'analyze': ['project', 'pull_id', 'pull_number', 'filename', 'commit_before', 'commit_while', 'user_id',
+                'owner_id', 'message', 'created_at', 'original_start_line', 'original_line',
+                'file_content_before', 'file_content_while', 'file_content_after'],
+    # replication/analyze_data.py (Analyzer with Gerrit data)
+    'analyze_gerrit': ['project', 'change_id', 'revision_number', 'filename', 'commit_before', 'commit_while',
+                       'change_owner', 'owner', 'message', 'created_at', 'comment_start_line', 'line',
+                       'comment_end_line', 'start_character', 'end_character',
+                       'file_content_before', 'file_content_after'],
+    # conversation_context/extract_conversations.py
+    'conversations': ['pull_id', 'pull_number', 'filename', 'user_id', 'owner_id', 'message', 'created_at',
+                      'original_start_line', 'original_line', 'file_content_while'],
+    # manual_inspection (manual_analysis_filtered_complete.csv)
+    'manual_inspection': ['url', 'filename', 'user_id', 'owner_id', 'message', 'created_at', 'original_line'],
+}
+
+# fields repeated by many comments
+CATEGORICAL_COLUMNS = ['project', 'filename']
+
+# file contents, shared by all the comments on the same revision of a file, so each one is kept only once
+CONTENT_COLUMNS = ['file_content_before', 'file_content_while', 'file_content_after']
+
+# categorical fields compared with each other, which need the same categories
+SHARED_CATEGORICAL_COLUMNS = ['user_id', 'owner_id']
+
+
+def load_raw_data(path, stage, chunksize=None):
+    columns = STAGE_COLUMNS[stage]
+    dtype = {column: 'category' for column in CATEGORICAL_COLUMNS + CONTENT_COLUMNS if column in columns}
+
+    reader = pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize)
+    if chunksize is None:
+        return share_categories(reader)
+    return (share_categories(df) for df in reader)
+
+
+def share_categories(df):
+    for column in CONTENT_COLUMNS:
+        # missing contents are replaced with '' by the Analyzer
+        if column in df.columns and '' not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories([''])
+
+    # converted after parsing, so that e.g. 1 and 1.0 are still the same user
+    columns = [column for column in SHARED_CATEGORICAL_COLUMNS if column in df.columns]
+    if len(columns) > 0:
+        categories = pd.Index(df[columns[0]].dropna().unique())
+        for column in columns[1:]:
+            categories = categories.union(pd.Index(df[column].dropna().unique()))
+        for column in columns:
+            df[column] = df[column].astype(CategoricalDtype(categories))
+    return df
@@ -1,5 +1,32 @@
+import functools
 import os
 
+WORKING_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCES = [os.path.join(WORKING_DIR, "stop-words-english.txt"), os.path.join(WORKING_DIR, "my_idioms_300.txt")]
+# stopwords of get_stopwords, written once and read again while the files they come from do not change,
+# kept in the data folder with the other outputs of the runs
+CACHE_PATH = os.path.join(os.path.dirname(WORKING_DIR), "data", "stopwords.cache")
+
+
+class StopwordLexicon:
+
+    def __init__(self, words, case=str.upper):
+        # words compared after applying case to both them and the words of the texts
+        self.case = case
+        self.words = frozenset(case(word) for word in words)
+
+    def __contains__(self, word):
+        return self.case(word) in self.words
+
+    def strip(self, text):
+        # text without its stopwords, the other words separated by a single space
+        return ' '.join([word for word in text.split() if self.case(word) not in self.words])
+
+    def strip_stopwords(self, column):
+        words = self.words
+        case = self.case
+        return [' '.join([word for word in text.split() if case(word) not in words]) for text in column]
+
 
 def get_stopwords():
     keywords = ['abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class',
@@ -13,14 +40,52 @@ def get_stopwords():
 
     keywords = [k.upper() for k in keywords]
 
-    working_dir = os.path.dirname(os.path.abspath(__file__))
-    stopwords = [line.strip().upper() for line in open(os.path.join(working_dir, "stop-words-english.txt"))]
+    stopwords = [line.strip().upper() for line in open(SOURCES[0])]
     stopwords.append('NIT')
 
-    idioms = [line.strip().upper() for line in open(os.path.join(working_dir, "my_idioms_300.txt"))]
+    idioms = [line.strip().upper() for line in open(SOURCES[1])]
 
+    # popping while iterating skips the word after each one removed, kept as it is to keep the same stopwords
     for word in stopwords:
         if word in idioms or word in keywords:
             stopwords.pop(stopwords.index(word))
 
     return stopwords
+
+
+def get_fingerprint():
+    return ' '.join(f'{os.path.basename(path)}:{os.stat(path).st_size}:{os.stat(path).st_mtime_ns}'
+                    for path in SOURCES)
+
+
+def read_cache(fingerprint):
+    if not os.path.exists(CACHE_PATH):
+        return None
+    with open(CACHE_PATH, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    if lines[0] != fingerprint:
+        return None
+    return lines[1:]
+
+
+def write_cache(fingerprint, stopwords):
+    # written to a temporary file first, other processes may be reading the cache at the same time
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    temp_path = f'{CACHE_PATH}.{os.getpid()}'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join([fingerprint] + stopwords))
+    os.replace(temp_path, CACHE_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_lexicon():
+    # lexicon of get_stopwords, built once for each process
+    fingerprint = get_fingerprint()
+    stopwords = read_cache(fingerprint)
+    if stopwords is None:
+        stopwords = get_stopwords()
+        try:
+            write_cache(fingerprint, stopwords)
+        except OSError:
+            pass
+    return StopwordLexicon(stopwords)